@@ -0,0 +1,220 @@
+# benchmarks/generators.py
+# -*- coding: utf-8 -*-
+"""
+确定性合成数据：按各家 API 的真实报文结构生成 Route53 / Cloudflare / AliDNS / EC2 / SLB 记录。
+同一 seed + 规模生成的数据完全相同，便于跨版本比较。
+
+批次格式与采集器调用 process_resources 时一致：
+    (provider, resource_type, ctx, records)
+ctx 即 process_resources 的 **ctx（account_id / zone_id / zone_name / status / region）。
+"""
+import random
+import string
+from typing import Any, Dict, Iterator, List, Tuple
+
+Batch = Tuple[str, str, Dict[str, Any], List[Dict[str, Any]]]
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# 各来源占比；DNS 为大头
+MIX = (
+    ("route53", 0.30),
+    ("cloudflare", 0.25),
+    ("alidns", 0.25),
+    ("ec2", 0.10),
+    ("slb", 0.10),
+)
+
+ZONE_SIZE = 500          # 每个 zone / 批次的记录数，接近真实分页后一次 process_resources 的量
+ACCOUNTS = ("111122223333", "444455556666", "cf-acct-01", "ali-acct-01")
+REGIONS = ("ap-east-1", "us-west-2", "cn-hangzhou", "cn-hongkong", "ap-southeast-1")
+
+
+def parse_scale(s: str) -> int:
+    s = s.lower()
+    return SCALES[s] if s in SCALES else int(s)
+
+
+def _word(rnd: random.Random, n: int = 8) -> str:
+    return "".join(rnd.choice(string.ascii_lowercase) for _ in range(n))
+
+
+def _ip(rnd: random.Random, private: bool = False) -> str:
+    if private:
+        return f"10.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(1, 255)}"
+    return f"{rnd.randrange(1, 224)}.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(1, 255)}"
+
+
+def _zone(rnd: random.Random, i: int) -> str:
+    return f"{_word(rnd, 6)}{i}.{rnd.choice(('com', 'net', 'io', 'cn'))}"
+
+
+def _dns_value(rnd: random.Random, rtype: str, zone: str) -> str:
+    if rtype == "A":
+        return _ip(rnd)
+    if rtype == "CNAME":
+        return f"{_word(rnd, 5)}.{zone}"
+    if rtype == "MX":
+        return f"mail.{zone}"
+    return f"v=spf1 include:{_word(rnd, 6)}.com ~all"
+
+
+def _rtype(rnd: random.Random) -> str:
+    return rnd.choices(("A", "CNAME", "MX", "TXT"), weights=(60, 25, 5, 10))[0]
+
+
+# ----------------------------
+# 各来源单条记录
+# ----------------------------
+def route53_record(rnd: random.Random, zone: str, i: int) -> Dict[str, Any]:
+    rtype = _rtype(rnd)
+    rec: Dict[str, Any] = {"Name": f"h{i}-{_word(rnd, 4)}.{zone}.", "Type": rtype}
+    if rtype == "A" and rnd.random() < 0.15:
+        rec["AliasTarget"] = {"HostedZoneId": "Z35SXDOTRQ7X7K", "EvaluateTargetHealth": False,
+                              "DNSName": f"dualstack.lb-{_word(rnd, 6)}.{rnd.choice(REGIONS)}.elb.amazonaws.com."}
+    else:
+        rec["TTL"] = rnd.choice((60, 300, 3600))
+        rec["ResourceRecords"] = [{"Value": _dns_value(rnd, rtype, zone)} for _ in range(rnd.choice((1, 1, 1, 2, 4)))]
+    if rnd.random() < 0.05:
+        rec["SetIdentifier"] = f"weighted-{i}"
+        rec["Weight"] = rnd.randrange(0, 255)
+    return rec
+
+
+def cloudflare_record(rnd: random.Random, zone: str, zone_id: str, i: int) -> Dict[str, Any]:
+    rtype = _rtype(rnd)
+    return {
+        "id": f"{rnd.getrandbits(128):032x}",
+        "zone_id": zone_id,
+        "zone_name": zone,
+        "name": f"h{i}-{_word(rnd, 4)}.{zone}",
+        "type": rtype,
+        "content": _dns_value(rnd, rtype, zone),
+        "proxiable": True,
+        "proxied": rtype in ("A", "CNAME") and rnd.random() < 0.5,
+        "ttl": 1,
+        "locked": False,
+        "meta": {"auto_added": False, "managed_by_apps": False, "source": "primary"},
+        "comment": None,
+        "tags": [],
+        "created_on": "2024-03-01T08:00:00.000000Z",
+        "modified_on": "2025-06-01T08:00:00.000000Z",
+        **({"priority": 10} if rtype == "MX" else {}),
+    }
+
+
+def alidns_record(rnd: random.Random, zone: str, i: int) -> Dict[str, Any]:
+    rtype = _rtype(rnd)
+    return {
+        "RR": f"h{i}-{_word(rnd, 4)}",
+        "Line": rnd.choice(("default", "telecom", "unicom", "mobile", "oversea")),
+        "Status": rnd.choice(("ENABLE", "ENABLE", "ENABLE", "DISABLE")),
+        "Locked": False,
+        "Type": rtype,
+        "DomainName": zone,
+        "Value": _dns_value(rnd, rtype, zone),
+        "RecordId": str(rnd.randrange(10 ** 17, 10 ** 18)),
+        "TTL": rnd.choice((600, 3600)),
+        "Weight": 1,
+        **({"Priority": 10} if rtype == "MX" else {}),
+    }
+
+
+def ec2_instance(rnd: random.Random, region: str, i: int) -> Dict[str, Any]:
+    # 字段形状按 core/meta_normalizer.normalize_ecs_aws 的读取方式
+    private = _ip(rnd, private=True)
+    return {
+        "InstanceId": f"i-{rnd.getrandbits(68):017x}",
+        "InstanceType": rnd.choice(("t3.micro", "m5.large", "c6i.xlarge", "r6g.2xlarge")),
+        "ImageId": f"ami-{rnd.getrandbits(68):017x}",
+        "State": {"Code": 16, "Name": rnd.choice(("running", "running", "stopped"))},
+        "PublicIpAddress": {"PublicIp": [_ip(rnd)] if rnd.random() < 0.6 else []},
+        "PrivateIpAddress": private,
+        "VpcId": f"vpc-{rnd.getrandbits(32):08x}",
+        "SubnetId": f"subnet-{rnd.getrandbits(32):08x}",
+        "Placement": {"AvailabilityZone": f"{region}{rnd.choice('abc')}", "Tenancy": "default"},
+        "SecurityGroups": [{"GroupId": f"sg-{rnd.getrandbits(32):08x}", "GroupName": _word(rnd)}],
+        "BlockDeviceMappings": [{"DeviceName": "/dev/xvda", "Ebs": {"VolumeId": f"vol-{rnd.getrandbits(68):017x}",
+                                                                   "Status": "attached", "DeleteOnTermination": True}}],
+        "Tags": [{"Key": "Name", "Value": f"web-{i}"}, {"Key": "env", "Value": rnd.choice(("prod", "staging", "dev"))}],
+        "LaunchTime": "2025-01-15T03:04:05+00:00",
+    }
+
+
+def slb_instance(rnd: random.Random, region: str, i: int) -> Dict[str, Any]:
+    return {
+        "LoadBalancerId": f"lb-{rnd.getrandbits(80):020x}",
+        "LoadBalancerName": f"slb-{_word(rnd, 5)}-{i}",
+        "LoadBalancerStatus": rnd.choice(("active", "active", "inactive")),
+        "Address": _ip(rnd),
+        "AddressType": rnd.choice(("internet", "intranet")),
+        "RegionId": region,
+        "VpcId": f"vpc-{rnd.getrandbits(64):016x}",
+        "VSwitchId": f"vsw-{rnd.getrandbits(64):016x}",
+        "LoadBalancerSpec": "slb.s2.small",
+        "ListenerPortsAndProtocol": {"ListenerPortsAndProtocol": [
+            {"ListenerPort": p, "ListenerProtocol": "https" if p == 443 else "http"} for p in (80, 443)]},
+        "CreateTime": "2024-11-20T10:00Z",
+    }
+
+
+# ----------------------------
+# 批次
+# ----------------------------
+def _counts(total: int) -> Dict[str, int]:
+    out = {k: int(total * w) for k, w in MIX}
+    out[MIX[0][0]] += total - sum(out.values())
+    return out
+
+
+def batches(total: int, seed: int = 42) -> Iterator[Batch]:
+    """按来源依次产出批次；惰性生成，1M 规模也不会一次性占满内存"""
+    rnd = random.Random(seed)
+    counts = _counts(total)
+    zi = 0
+    for source, n in counts.items():
+        done = 0
+        while done < n:
+            size = min(ZONE_SIZE, n - done)
+            zi += 1
+            if source in ("route53", "cloudflare", "alidns"):
+                zone = _zone(rnd, zi)
+                zone_id = f"Z{rnd.getrandbits(64):016X}" if source == "route53" else f"{rnd.getrandbits(128):032x}"
+                if source == "route53":
+                    recs = [route53_record(rnd, zone, done + j) for j in range(size)]
+                    yield "aws", "dns_record", {"account_id": ACCOUNTS[0], "zone_id": zone_id, "zone_name": zone,
+                                                "status": "active", "region": None}, recs
+                elif source == "cloudflare":
+                    recs = [cloudflare_record(rnd, zone, zone_id, done + j) for j in range(size)]
+                    yield "cloudflare", "dns_record", {"account_id": ACCOUNTS[2], "zone_id": zone_id, "zone_name": zone,
+                                                       "status": "active", "region": None}, recs
+                else:
+                    recs = [alidns_record(rnd, zone, done + j) for j in range(size)]
+                    yield "aliyun", "dns_record", {"account_id": ACCOUNTS[3], "zone_id": None, "zone_name": zone,
+                                                   "status": "active", "region": None}, recs
+            else:
+                region = rnd.choice(REGIONS)
+                if source == "ec2":
+                    recs = [ec2_instance(rnd, region, done + j) for j in range(size)]
+                    yield "aws", "ecs", {"account_id": ACCOUNTS[1], "region": region}, recs
+                else:
+                    recs = [slb_instance(rnd, region, done + j) for j in range(size)]
+                    yield "aliyun", "slb", {"account_id": ACCOUNTS[3], "region": region}, recs
+            done += size
+
+
+def mutate(rnd: random.Random, provider: str, resource_type: str, rec: Dict[str, Any]) -> Dict[str, Any]:
+    """复制一条记录并改一个会进入 diff 的字段（第二轮写入模拟变更）"""
+    rec = dict(rec)
+    if resource_type == "dns_record":
+        if provider == "aws":
+            rec["TTL"] = (rec.get("TTL") or 300) + 1
+        elif provider == "cloudflare":
+            rec["proxied"] = not rec.get("proxied")
+        else:
+            rec["TTL"] = (rec.get("TTL") or 600) + 1
+    elif resource_type == "ecs":
+        rec["State"] = {"Code": 80, "Name": "stopped" if rec["State"]["Name"] == "running" else "running"}
+    else:
+        rec["LoadBalancerStatus"] = "inactive" if rec.get("LoadBalancerStatus") == "active" else "active"
+    return rec
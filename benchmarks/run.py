@@ -0,0 +1,355 @@
+# benchmarks/run.py
+# -*- coding: utf-8 -*-
+"""
+基准套件：normalize_meta / process_resources / SQLite 写入 / DNS 解析（本地 stub）。
+结果输出为 JSON，便于跨版本对比。
+
+用法：
+    python -m benchmarks.run --scale 1k
+    python -m benchmarks.run --scale 100k --suite normalize,pipeline --out bench-100k.json
+    python -m benchmarks.run --scale 1k --baseline bench-old.json     # 附带与旧结果的比值
+
+- 规模：1k / 100k / 1m 或任意整数；数据由 benchmarks/generators.py 按 seed 确定性生成
+- writer：临时 SQLite 库，三个阶段
+    insert   首轮全量写入（insert_batch_or_log_diff，按 DB_WRITE_BATCH 提交）
+    rescan   第二轮同一批数据，其中 --change-ratio 比例被改动（走 diff 路径）
+    single   逐条调用 insert_if_not_exists_or_log_diff（最多 --single-limit 条）
+- resolver：对前 --resolve-limit 个不同域名逐个调用 resolve_dns，指向本地 stub DNS
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from itertools import islice
+from statistics import median
+from typing import Any, Dict, Iterable, List, Optional
+
+from benchmarks.generators import batches, mutate, parse_scale
+
+SUITES = ("normalize", "pipeline", "writer", "resolver")
+
+
+def _pct(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def _result(name: str, n: int, seconds: float, samples: Optional[List[float]] = None, **extra) -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "name": name,
+        "records": n,
+        "seconds": round(seconds, 4),
+        "records_per_sec": round(n / seconds, 1) if seconds > 0 else None,
+    }
+    if samples:
+        out["p50_ms"] = round(1000 * median(samples), 3)
+        out["p99_ms"] = round(1000 * _pct(samples, 0.99), 3)
+    out.update(extra)
+    print(f"[bench] {name}: {n} 条 {out['seconds']}s ({out['records_per_sec']}/s)", file=sys.stderr)
+    return out
+
+
+# ----------------------------
+# normalize / pipeline
+# ----------------------------
+def bench_normalize(total: int, seed: int) -> List[Dict[str, Any]]:
+    from core.meta_normalizer import normalize_meta
+
+    elapsed, n = 0.0, 0
+    for provider, rtype, ctx, recs in batches(total, seed):
+        t0 = time.perf_counter()
+        for rec in recs:
+            normalize_meta(provider, rtype, rec, **ctx)
+        elapsed += time.perf_counter() - t0
+        n += len(recs)
+    return [_result("normalize_meta", n, elapsed)]
+
+
+def bench_pipeline(total: int, seed: int, workers: int = 0) -> List[Dict[str, Any]]:
+    from core import resource_pipeline
+    from core.resource_pipeline import process_resources
+
+    out = []
+    for name, n_workers in (("process_resources", 0), ("process_resources.pool", workers)):
+        if name != "process_resources" and not n_workers:
+            continue
+        resource_pipeline.PIPELINE_WORKERS = n_workers
+        elapsed, n, samples = 0.0, 0, []
+        for provider, rtype, ctx, recs in batches(total, seed):
+            t0 = time.perf_counter()
+            process_resources(provider, rtype, recs, **ctx)
+            dt = time.perf_counter() - t0
+            elapsed += dt
+            samples.append(dt)
+            n += len(recs)
+        out.append(_result(name, n, elapsed, samples, unit_of_samples="batch", workers=n_workers))
+    resource_pipeline.PIPELINE_WORKERS = 0
+    return out
+
+
+# ----------------------------
+# writer
+# ----------------------------
+def _items(total: int, seed: int, change_ratio: float = 0.0) -> Iterable[List[Dict[str, Any]]]:
+    """按批产出 pipeline item；change_ratio > 0 时按固定随机序列改动部分记录"""
+    from core.resource_pipeline import process_resources
+
+    rnd = random.Random(seed + 1)
+    for provider, rtype, ctx, recs in batches(total, seed):
+        if change_ratio:
+            recs = [mutate(rnd, provider, rtype, r) if rnd.random() < change_ratio else r for r in recs]
+        yield process_resources(provider, rtype, recs, **ctx)
+
+
+def _to_orm(item: Dict[str, Any], acct_id: str):
+    # 与 main._dict_to_cloud_resource 相同的映射；main 在导入时会连接默认库，这里不引用
+    from core.models import CloudResource
+    return CloudResource(
+        id=str(uuid.uuid4()),
+        cloud_account_id=acct_id,
+        resource_type=item.get("resource_type"),
+        resource_id=item.get("resource_id"),
+        region=item.get("region"),
+        provider=item.get("provider"),
+        zone=item.get("zone"),
+        name=item.get("name"),
+        status=item.get("status"),
+        domain_name=item.get("domain_name"),
+        vpc_id=item.get("vpc_id"),
+        ip_addresses=item.get("ip_addresses"),
+        tags=item.get("tags"),
+        resource_metadata=item.get("resource_metadata"),
+        fetched_at=datetime.utcnow(),
+    )
+
+
+def _accounts(session) -> Dict[tuple, str]:
+    from core.models import CloudAccount, CloudProvider
+    from benchmarks.generators import ACCOUNTS
+
+    out = {}
+    for provider, acct in (("aws", ACCOUNTS[0]), ("aws", ACCOUNTS[1]), ("cloudflare", ACCOUNTS[2]), ("aliyun", ACCOUNTS[3])):
+        row = CloudAccount(id=str(uuid.uuid4()), name=f"bench-{acct}", provider=CloudProvider(provider), account_id=acct)
+        session.add(row)
+        out[(provider, acct)] = row.id
+    session.commit()
+    return out
+
+
+def _write_pass(name: str, total: int, seed: int, accts: Dict[tuple, str], change_ratio: float = 0.0) -> Dict[str, Any]:
+    from core.database import get_session, batched, DB_WRITE_BATCH
+    from core.db_writer import insert_batch_or_log_diff
+
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+    elapsed, n, samples = 0.0, 0, []
+    for items in _items(total, seed, change_ratio):
+        for chunk in batched(items, DB_WRITE_BATCH):
+            objs = [_to_orm(it, accts[(it["provider"], it["account_id"])]) for it in chunk]
+            sess = get_session()
+            t0 = time.perf_counter()
+            try:
+                s = insert_batch_or_log_diff(sess, objs)
+                sess.commit()
+            finally:
+                sess.close()
+            dt = time.perf_counter() - t0
+            elapsed += dt
+            samples.append(dt)
+            n += len(objs)
+            for k, v in s.items():
+                stats[k] += v
+    return _result(name, n, elapsed, samples, unit_of_samples="batch", batch_size=DB_WRITE_BATCH, **stats)
+
+
+def _single_pass(limit: int, seed: int, total: int, accts: Dict[tuple, str]) -> Dict[str, Any]:
+    from core.database import get_session, DB_WRITE_BATCH
+    from core.db_writer import insert_if_not_exists_or_log_diff
+
+    def flat():
+        for items in _items(total, seed):
+            yield from items
+
+    elapsed, n, samples = 0.0, 0, []
+    sess = get_session()
+    try:
+        for it in islice(flat(), limit):
+            obj = _to_orm(it, accts[(it["provider"], it["account_id"])])
+            t0 = time.perf_counter()
+            insert_if_not_exists_or_log_diff(sess, obj)
+            n += 1
+            if n % DB_WRITE_BATCH == 0:
+                sess.commit()
+            dt = time.perf_counter() - t0
+            elapsed += dt
+            samples.append(dt)
+        t0 = time.perf_counter()
+        sess.commit()
+        elapsed += time.perf_counter() - t0
+    finally:
+        sess.close()
+    return _result("writer.single", n, elapsed, samples, unit_of_samples="record")
+
+
+def bench_writer(total: int, seed: int, db_path: Optional[str], change_ratio: float, single_limit: int) -> List[Dict[str, Any]]:
+    from core.database import setup_database, get_session
+
+    tmpdir = None
+    if not db_path:
+        tmpdir = tempfile.mkdtemp(prefix="crm-bench-")
+        db_path = os.path.join(tmpdir, "bench.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    engine = setup_database(f"sqlite:///{db_path}")
+    try:
+        sess = get_session()
+        try:
+            accts = _accounts(sess)
+        finally:
+            sess.close()
+        out = [
+            _write_pass("writer.insert", total, seed, accts),
+            _write_pass("writer.rescan", total, seed, accts, change_ratio=change_ratio),
+        ]
+        if single_limit:
+            out.append(_single_pass(min(single_limit, total), seed, total, accts))
+        out[-1]["db_bytes"] = os.path.getsize(db_path)
+        return out
+    finally:
+        engine.dispose()
+        if tmpdir:
+            for f in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, f))
+            os.rmdir(tmpdir)
+
+
+# ----------------------------
+# resolver
+# ----------------------------
+def bench_resolver(total: int, seed: int, limit: int, delay: float) -> List[Dict[str, Any]]:
+    from resolvers.dns_resolver import resolve_dns
+    from benchmarks.stub_dns import StubDNSServer
+
+    names: List[str] = []
+    seen = set()
+    for provider, rtype, ctx, recs in batches(total, seed):
+        if rtype != "dns_record":
+            continue
+        for it in recs:
+            name = (it.get("Name") or it.get("name") or f"{it.get('RR')}.{ctx.get('zone_name')}").rstrip(".")
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+        if len(names) >= limit:
+            break
+    names = names[:limit]
+
+    samples: List[float] = []
+    errors = 0
+    with StubDNSServer(delay=delay) as srv:
+        t_all = time.perf_counter()
+        for name in names:
+            t0 = time.perf_counter()
+            res = resolve_dns(name, description="bench", nameservers=[srv.host], port=srv.port)
+            samples.append(time.perf_counter() - t0)
+            errors += 0 if res["resolved_data"] else 1
+        elapsed = time.perf_counter() - t_all
+    return [_result("resolve_dns", len(names), elapsed, samples, unit_of_samples="query",
+                    errors=errors, stub_delay_ms=round(delay * 1000, 3))]
+
+
+# ----------------------------
+# 汇总
+# ----------------------------
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _meta(args, total: int) -> Dict[str, Any]:
+    import sqlalchemy
+    from core.serialization import BACKEND
+    return {
+        "git_rev": _git_rev(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "json_backend": BACKEND,
+        "scale": total,
+        "seed": args.seed,
+        "suites": args.suite,
+        "env": {k: os.environ[k] for k in ("STORE_PROVIDER_RAW", "DB_WRITE_BATCH", "JSON_COMPRESSION") if k in os.environ},
+    }
+
+
+def _compare(results: List[Dict[str, Any]], baseline_path: str) -> Dict[str, Any]:
+    """与旧结果按 name 对比 records_per_sec（>1 表示变快）"""
+    with open(baseline_path, encoding="utf-8") as f:
+        base = {r["name"]: r for r in json.load(f).get("results", [])}
+    out = {}
+    for r in results:
+        b = base.get(r["name"])
+        if b and b.get("records_per_sec") and r.get("records_per_sec"):
+            out[r["name"]] = round(r["records_per_sec"] / b["records_per_sec"], 3)
+    return out
+
+
+def main(argv=None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="合成数据基准（JSON 输出）")
+    parser.add_argument("--scale", default="1k", help="1k / 100k / 1m 或整数")
+    parser.add_argument("--suite", default=",".join(SUITES), help=f"逗号分隔：{','.join(SUITES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="结果写入文件（默认 stdout）")
+    parser.add_argument("--baseline", help="旧结果 JSON，输出 records_per_sec 比值")
+    parser.add_argument("--db", help="writer 使用的 SQLite 文件（默认临时目录，结束后删除）")
+    parser.add_argument("--change-ratio", type=float, default=0.1, help="writer.rescan 中被改动的比例")
+    parser.add_argument("--single-limit", type=int, default=5000, help="writer.single 最多写入条数，0 跳过")
+    parser.add_argument("--resolve-limit", type=int, default=2000, help="resolver 解析的域名个数")
+    parser.add_argument("--pipeline-workers", type=int, default=0,
+                        help="pipeline 额外跑一遍进程池模式（PIPELINE_WORKERS），0 跳过")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="stub DNS 每次应答前的延迟（秒）")
+    args = parser.parse_args(argv)
+
+    total = parse_scale(args.scale)
+    suites = [s.strip() for s in args.suite.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"未知 suite：{', '.join(sorted(unknown))}")
+
+    report: Dict[str, Any] = {"meta": _meta(args, total), "results": []}
+    for s in suites:
+        if s == "normalize":
+            report["results"] += bench_normalize(total, args.seed)
+        elif s == "pipeline":
+            report["results"] += bench_pipeline(total, args.seed, args.pipeline_workers)
+        elif s == "writer":
+            report["results"] += bench_writer(total, args.seed, args.db, args.change_ratio, args.single_limit)
+        elif s == "resolver":
+            report["results"] += bench_resolver(total, args.seed, args.resolve_limit, args.stub_delay)
+    if args.baseline:
+        report["vs_baseline"] = _compare(report["results"], args.baseline)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"[bench] 结果已写入 {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/stub_dns.py
+# -*- coding: utf-8 -*-
+"""
+本地 UDP stub DNS：任何 A 查询都返回由名字哈希出的固定地址，其他类型返回 NOERROR 空答案。
+用于在不依赖外网的情况下测 resolvers.dns_resolver.resolve_dns 的吞吐与延迟。
+"""
+import socket
+import hashlib
+import threading
+from typing import Optional
+
+import dns.flags
+import dns.message
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+
+
+def _answer_ip(name: str) -> str:
+    d = hashlib.blake2b(name.lower().encode("utf-8"), digest_size=4).digest()
+    return f"10.{d[0]}.{d[1]}.{d[2] or 1}"
+
+
+class StubDNSServer:
+    """with StubDNSServer() as srv: resolve_dns(..., nameservers=[srv.host], port=srv.port)"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        self.host = host
+        self.delay = delay          # 模拟上游 RTT（秒）
+        self.queries = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.settimeout(0.2)
+        self.port = self._sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _serve(self) -> None:
+        while not self._stop.is_set():
+            try:
+                wire, addr = self._sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            try:
+                query = dns.message.from_wire(wire)
+            except Exception:
+                continue
+            resp = dns.message.make_response(query)
+            resp.flags |= dns.flags.AA
+            for q in query.question:
+                if q.rdtype == dns.rdatatype.A:
+                    resp.answer.append(dns.rrset.from_text(q.name, 60, dns.rdataclass.IN, dns.rdatatype.A,
+                                                           _answer_ip(q.name.to_text())))
+            if self.delay:
+                self._stop.wait(self.delay)
+            self.queries += 1
+            self._sock.sendto(resp.to_wire(), addr)
+
+    def start(self) -> "StubDNSServer":
+        self._thread = threading.Thread(target=self._serve, name="stub-dns", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
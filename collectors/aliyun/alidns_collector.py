@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from typing import List, Dict, Any, Callable, Optional
 from core.resource_pipeline import process_resources
+from utils import metrics
 
 def collect_dns_records(
     alidns_client,
@@ -11,11 +12,12 @@ def collect_dns_records(
     records: List[Dict[str, Any]] = []
     page = 1
     while True:
-        resp = alidns_client.describe_domain_records(
-            DomainName=domain_name,
-            PageNumber=page,
-            PageSize=500
-        )
+        with metrics.api_call("aliyun", "DescribeDomainRecords", account_id, page=True):
+            resp = alidns_client.describe_domain_records(
+                DomainName=domain_name,
+                PageNumber=page,
+                PageSize=500
+            )
         batch = (resp.get("DomainRecords", {}) or {}).get("Record", [])
         records.extend(batch)
         total = resp.get("TotalCount") or len(records)
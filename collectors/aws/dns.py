@@ -8,13 +8,10 @@ from core.registry import register_collector
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 from tqdm import tqdm
-from jjutils.Tools import (
-    LoggerSetup,
-    q
-)
+from utils.logger import get_logger
 
 # 設置日誌
-logger = LoggerSetup(caller_file='aws_dns', log_dir="log", quiet_mode=False).get_logger()
+logger = get_logger("aws_dns")
 
 @register_collector("aws_dns")
 class AWSRoute53Collector(BaseCollector):
@@ -34,7 +31,7 @@ class AWSRoute53Collector(BaseCollector):
         # 1. 已注册域名
         try:
             domains = domain_client.list_domains().get("Domains", [])
-            logger.info(f"[aws_dns] Found {len(domains)} registered domains")
+            logger.info("[aws_dns] Found %d registered domains", len(domains))
 
             for d in domains:
                 results.append(ResourceItem(
@@ -57,7 +54,7 @@ class AWSRoute53Collector(BaseCollector):
         zones = []
         try:
             zones = route53.list_hosted_zones().get("HostedZones", [])
-            logger.info(f"[aws_dns] Found {len(zones)} hosted zones")
+            logger.info("[aws_dns] Found %d hosted zones", len(zones))
 
             for z in zones:
                 zone_id = z["Id"].split("/")[-1]
@@ -115,7 +112,7 @@ class AWSRoute53Collector(BaseCollector):
                             fetched_at=datetime.now()
                         ))
             except (BotoCoreError, ClientError, Exception) as e:
-                logger.exception(f"[!] DNS record list failed for zone {z.get('Id')}")
+                logger.exception("[!] DNS record list failed for zone %s", z.get("Id"))
 
-        logger.info(f"[aws_dns] Total resources collected: {len(results)}")
+        logger.info("[aws_dns] Total resources collected: %d", len(results))
         return results
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 from typing import List, Dict, Any, Callable, Optional
 from core.resource_pipeline import process_resources
+from utils import metrics
 
 def _rstrip_dot(s: Optional[str]) -> Optional[str]:
     return s[:-1] if isinstance(s, str) and s.endswith(".") else s
@@ -9,7 +10,8 @@ def _rstrip_dot(s: Optional[str]) -> Optional[str]:
 def _ensure_zone_name(route53_client, hosted_zone_id: str, zone_name: Optional[str]) -> str:
     if zone_name:
         return _rstrip_dot(zone_name)
-    resp = route53_client.get_hosted_zone(Id=hosted_zone_id)
+    with metrics.api_call("aws", "get_hosted_zone"):
+        resp = route53_client.get_hosted_zone(Id=hosted_zone_id)
     # HostedZone.Name 通常带一个结尾的点
     return _rstrip_dot(resp.get("HostedZone", {}).get("Name"))
 
@@ -24,7 +26,8 @@ def collect_dns_records(
 
     paginator = route53_client.get_paginator("list_resource_record_sets")
     all_records: List[Dict[str, Any]] = []
-    for page in paginator.paginate(HostedZoneId=hosted_zone_id):
+    pages = paginator.paginate(HostedZoneId=hosted_zone_id)
+    for page in metrics.timed_iter(pages, "aws", "list_resource_record_sets", account_id):
         all_records.extend(page.get("ResourceRecordSets", []))
 
     return process_resources(
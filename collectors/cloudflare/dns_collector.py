@@ -2,12 +2,14 @@
 # -*- coding: utf-8 -*-
 from typing import List, Dict, Any, Callable, Optional
 from core.resource_pipeline import process_resources
+from utils import metrics
 
 def _ensure_zone_name(cf_client, zone_id: str, zone_name: Optional[str]) -> str:
     if zone_name:
         return zone_name
     # 适配常见 Python Cloudflare SDK：/zones/:id
-    resp = cf_client.zones.get(zone_id=zone_id)
+    with metrics.api_call("cloudflare", "zones.get"):
+        resp = cf_client.zones.get(zone_id=zone_id)
     # 有的 SDK 是 resp["result"]["name"]，也见过 resp["name"]
     return (resp.get("result") or {}).get("name") or resp.get("name")
 
@@ -23,7 +25,8 @@ def collect_dns_records(
     records: List[Dict[str, Any]] = []
     page = 1
     while True:
-        resp = cf_client.zones.dns_records.get(zone_id=zone_id, page=page, per_page=100)
+        with metrics.api_call("cloudflare", "dns_records.get", account_id, page=True):
+            resp = cf_client.zones.dns_records.get(zone_id=zone_id, page=page, per_page=100)
         result = resp.get("result", [])
         records.extend(result)
         info = resp.get("result_info") or {}
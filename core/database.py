@@ -1,15 +1,48 @@
 # core/database.py
 
-from sqlalchemy.orm import sessionmaker
-from core.models import init_db
+import os
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+# 流式读取每次从服务端游标拉取的行数；批量写入每批提交的行数
+DB_YIELD_PER = int(os.getenv("DB_YIELD_PER", "2000"))
+DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "500"))
 
 _engine = None
 Session = None
 
 def setup_database(db_url: str):
+    # 延迟导入：只用 batched 等工具函数的离线路径（快照查询 / 导出）不加载 SQLAlchemy 与模型
+    from sqlalchemy.orm import sessionmaker
+    from core.models import init_db
     global _engine, Session
     _engine = init_db(db_url)
     Session = sessionmaker(bind=_engine)
+    from core.tag_index import ensure_built  # tag_index 依赖本模块，延迟导入
+    ensure_built()
+    return _engine
+
+def get_engine():
+    return _engine
 
 def get_session():
     return Session()
+
+def stream_rows(stmt, yield_per: int = DB_YIELD_PER) -> Iterator:
+    """
+    以服务端游标流式执行 select，只返回投影的列（Row），不构造 ORM 对象。
+    使用独立连接，调用方可以边读边在别的 session 中分批 commit，内存占用与总行数无关。
+    """
+    with _engine.connect() as conn:
+        result = conn.execution_options(yield_per=yield_per).execute(stmt)
+        for partition in result.partitions():
+            yield from partition
+
+def batched(it: Iterable, size: int = DB_WRITE_BATCH) -> Iterator[List]:
+    """把任意可迭代对象切成固定大小的 list，用于分批写入/提交"""
+    it = iter(it)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
@@ -1,8 +1,16 @@
 from sqlalchemy.dialects.mysql import insert
-from sqlalchemy import text
-from datetime import datetime
+from sqlalchemy import select, update, func, and_
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+import hashlib
 import json
-from core.models import CloudResource
+import uuid
+from core.database import stream_rows
+from core.models import CloudResource, ResolvedDnsRecord, ResourceDiffLog
+from core.summary import SummaryDelta, apply_delta, obj_buckets
+from core.tag_index import TagIndexDelta
+from core.domain_records import DomainRecordDelta
+from core.serialization import ItemSerializer, dumps, loads
 
 def obj_to_dict(obj):
     def serialize(val):
@@ -16,68 +24,304 @@ def obj_to_dict(obj):
     }
 
 
-def log_diff_if_changed(session, old_obj, new_obj):
-    changed_fields = []
-    def normalize(val):
-        if isinstance(val, dict) or isinstance(val, list):
-            return json.dumps(val, sort_keys=True, ensure_ascii=False)
-        return str(val)
+COMPARE_FIELDS = [
+    "name", "status", "zone", "domain_name",
+    "vpc_id", "ip_addresses", "tags", "resource_metadata"
+]
 
-    compare_fields = [
-        "name", "status", "zone", "domain_name",
-        "vpc_id", "ip_addresses", "tags", "resource_metadata"
-    ]
 
-    for field in compare_fields:
-        old_val = normalize(getattr(old_obj, field, None))
-        new_val = normalize(getattr(new_obj, field, None))
-        if old_val != new_val:
-            changed_fields.append(field)
+def _flatten(val, prefix: str, out: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(val, dict) and val:
+        for k, v in val.items():
+            _flatten(v, f"{prefix}.{k}", out)
+    else:
+        out[prefix] = val
+    return out
+
+
+def build_diff_payload(old_obj, new_obj, changed_fields: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    统一的 diff 载荷：{字段: {"old": 旧值, "new": 新值}}。
+    resource_metadata 展开为叶子路径（如 resource_metadata.extra.ttl），只保留变化的叶子；
+    完整前后快照见 raw_before / raw_after。
+    """
+    payload: Dict[str, Dict[str, Any]] = {}
+    for field in changed_fields:
+        old_val, new_val = getattr(old_obj, field, None), getattr(new_obj, field, None)
+        if field != "resource_metadata":
+            payload[field] = {"old": old_val, "new": new_val}
+            continue
+        old_flat = _flatten(old_val or {}, field, {})
+        new_flat = _flatten(new_val or {}, field, {})
+        for path in sorted(set(old_flat) | set(new_flat)):
+            if old_flat.get(path) != new_flat.get(path):
+                payload[path] = {"old": old_flat.get(path), "new": new_flat.get(path)}
+    return payload
+
+
+def parse_diff_payload(raw: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """读取 changed_fields；兼容旧版只记录字段名列表的格式（old/new 为 None）"""
+    if not raw:
+        return {}
+    try:
+        data = loads(raw)
+    except ValueError:
+        return {}
+    if isinstance(data, list):
+        return {f: {"old": None, "new": None} for f in data}
+    return data if isinstance(data, dict) else {}
+
+
+def log_diff_if_changed(session, old_obj, new_obj, changed_at: Optional[datetime] = None):
+    # 各字段规范形式按对象缓存，比较与 raw_before / raw_after 共用，每个值只序列化一次
+    old_ser, new_ser = ItemSerializer(old_obj), ItemSerializer(new_obj)
+    changed_fields = [f for f in COMPARE_FIELDS if old_ser.canonical(f) != new_ser.canonical(f)]
 
     if changed_fields:
-        session.execute(text("""
-            INSERT INTO resource_diff_log (
-                cloud_account_id, provider, region,
-                resource_type, resource_id,
-                changed_fields, raw_before, raw_after, changed_at
-            ) VALUES (
-                :account_id, :provider, :region,
-                :type, :rid,
-                :fields, :before, :after, :time
-            )
-        """), {
-            "account_id": new_obj.cloud_account_id,
+        # 走表对象插入，raw_before / raw_after 经 CompressedText 压缩
+        session.execute(ResourceDiffLog.__table__.insert(), {
+            "cloud_account_id": new_obj.cloud_account_id,
             "provider": new_obj.provider,
             "region": new_obj.region,
-            "type": new_obj.resource_type,
-            "rid": new_obj.resource_id,
-            "fields": json.dumps(changed_fields, ensure_ascii=False),
-            "before": json.dumps(obj_to_dict(old_obj), ensure_ascii=False),
-            "after": json.dumps(obj_to_dict(new_obj), ensure_ascii=False),
-            "time": datetime.utcnow()
+            "resource_type": new_obj.resource_type,
+            "resource_id": new_obj.resource_id,
+            "zone": new_obj.zone,
+            "changed_fields": dumps(build_diff_payload(old_obj, new_obj, changed_fields)),
+            "raw_before": old_ser.document(),
+            "raw_after": new_ser.document(),
+            "changed_at": changed_at or datetime.utcnow(),
         })
+    return changed_fields
+
+_UPDATE_FIELDS = [
+    "name", "status", "zone", "domain_name",
+    "vpc_id", "ip_addresses", "tags", "resource_metadata", "fetched_at"
+]
+
+
+def insert_batch_or_log_diff(session, new_objs: List[CloudResource]) -> Dict[str, int]:
+    """
+    批量版 upsert：一次 IN 查询取回本批已存在的行，新资源 add，已存在则记 diff 并更新。
+    同一事务内增量维护 inventory_counter（core/summary.py）、resource_tag（core/tag_index.py）
+    与 domain_record（core/domain_records.py）。
+    不 commit，由调用方按批提交。
+    """
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not new_objs:
+        return stats
+
+    accts = {o.cloud_account_id for o in new_objs}
+    rids = {o.resource_id for o in new_objs}
+    existing_rows = session.query(CloudResource).filter(
+        CloudResource.cloud_account_id.in_(accts),
+        CloudResource.resource_id.in_(rids),
+    ).all()
+    existing = {(r.cloud_account_id, r.resource_type, r.resource_id): r for r in existing_rows}
+    unchanged_ids = []
+    fetched_at = None
+    delta = SummaryDelta()
+    tag_delta = TagIndexDelta()
+    dns_delta = DomainRecordDelta()
+    now = datetime.utcnow()
+
+    for new_obj in new_objs:
+        key = (new_obj.cloud_account_id, new_obj.resource_type, new_obj.resource_id)
+        old = existing.get(key)
+        if old is None:
+            if new_obj.id is None:
+                new_obj.id = str(uuid.uuid4())  # 标签索引需要在 flush 前拿到主键
+            session.add(new_obj)
+            existing[key] = new_obj
+            delta.add(new_obj)
+            tag_delta.insert(new_obj.id, new_obj.tags)
+            dns_delta.insert(new_obj)
+            stats["inserted"] += 1
+            continue
+        if log_diff_if_changed(session, old, new_obj, changed_at=now):
+            old_buckets = obj_buckets(old)
+            tag_delta.update(old.id, old.tags, new_obj.tags)
+            for field in _UPDATE_FIELDS:
+                setattr(old, field, getattr(new_obj, field))
+            delta.move(old_buckets, old)
+            dns_delta.update(old)
+            delta.diff(now)
+            stats["updated"] += 1
+        else:
+            unchanged_ids.append(old.id)
+            fetched_at = new_obj.fetched_at or fetched_at
+            stats["unchanged"] += 1
+
+    if unchanged_ids:
+        # 未变化的资源只刷新 fetched_at，一条 UPDATE 完成
+        session.execute(
+            update(CloudResource)
+            .where(CloudResource.id.in_(unchanged_ids))
+            .values(fetched_at=fetched_at or datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+    apply_delta(session, delta)
+    tag_delta.apply(session)
+    dns_delta.apply(session)
+    return stats
+
 
 def insert_if_not_exists_or_log_diff(session, new_obj: CloudResource):
-    existing = session.query(CloudResource).filter_by(
-    cloud_account_id=new_obj.cloud_account_id,
-    resource_type=new_obj.resource_type,
-    resource_id=new_obj.resource_id
-    ).first()
-    if existing:
-        log_diff_if_changed(session, existing, new_obj)
-    else:
-        session.add(new_obj)
+    insert_batch_or_log_diff(session, [new_obj])
 
-def insert_resolved_dns_record(session, resolved: dict, cloud_resource_id: str):
-    record = ResolvedDnsRecord(
-        id=resolved["id"],
-        cloud_resource_id=cloud_resource_id,
-        domain_name=resolved["domain_name"],
-        region=resolved["region"],
-        record_type=resolved["record_type"],
-        resolved_data=json.dumps(resolved["resolved_data"], ensure_ascii=False),
-        description=resolved["description"],
-        resolved_at=resolved["resolved_at"]
+
+# changed_at 取自写入批次开始，可能早于下游上次构建、却在其后才提交，起点往前多看一段
+DIFF_SINCE_SLACK = timedelta(minutes=10)
+
+
+def changed_resource_pks(since: datetime) -> Set[str]:
+    """
+    since（减去 DIFF_SINCE_SLACK）之后 resource_diff_log 有记录的 cloud_resource.id，
+    供派生索引（关系图、IP 索引）增量刷新；新插入的资源不记 diff，由调用方按主键集合自行比对。
+    """
+    cr, dl = CloudResource, ResourceDiffLog
+    stmt = select(cr.id).join(dl, and_(
+        dl.cloud_account_id == cr.cloud_account_id,
+        dl.resource_type == cr.resource_type,
+        dl.resource_id == cr.resource_id,
+    )).where(dl.changed_at >= since - DIFF_SINCE_SLACK).distinct()
+    return {r.id for r in stream_rows(stmt)}
+
+
+def _to_datetime(val) -> datetime:
+    if isinstance(val, datetime):
+        return val
+    if isinstance(val, str) and val:
+        return datetime.fromisoformat(val.replace("Z", ""))
+    return datetime.utcnow()
+
+
+def _answer_key(data) -> str:
+    """答案集合的规范形式：排序去重后的 JSON"""
+    return json.dumps(sorted(set(data or [])), ensure_ascii=False)
+
+
+def _latest_intervals(session, keys) -> Dict[tuple, Any]:
+    """取每个 (domain_name, region, record_type) 当前（first_seen 最大）的区间行"""
+    if not keys:
+        return {}
+    names = sorted({k[0] for k in keys})
+    latest = (
+        select(
+            ResolvedDnsRecord.domain_name,
+            ResolvedDnsRecord.region,
+            ResolvedDnsRecord.record_type,
+            func.max(ResolvedDnsRecord.first_seen).label("first_seen"),
+        )
+        .where(ResolvedDnsRecord.domain_name.in_(names))
+        .group_by(ResolvedDnsRecord.domain_name, ResolvedDnsRecord.region, ResolvedDnsRecord.record_type)
+        .subquery()
     )
-    session.add(record)
+    stmt = select(
+        ResolvedDnsRecord.id,
+        ResolvedDnsRecord.domain_name,
+        ResolvedDnsRecord.region,
+        ResolvedDnsRecord.record_type,
+        ResolvedDnsRecord.answer_hash,
+        ResolvedDnsRecord.resolved_data,
+    ).join(latest, and_(
+        ResolvedDnsRecord.domain_name == latest.c.domain_name,
+        ResolvedDnsRecord.region == latest.c.region,
+        ResolvedDnsRecord.record_type == latest.c.record_type,
+        ResolvedDnsRecord.first_seen == latest.c.first_seen,
+    ))
+    out = {}
+    for row in session.execute(stmt):
+        key = (row.domain_name, row.region, row.record_type)
+        if key in keys:
+            out[key] = row
+    return out
+
+
+def _row_hash(row) -> str:
+    """区间行的答案摘要；迁移前的旧行 answer_hash 为空（resolved_data 为未排序的 JSON 列表），现场补算"""
+    if row.answer_hash:
+        return row.answer_hash
+    try:
+        data = loads(row.resolved_data) if row.resolved_data else []
+    except ValueError:
+        return ""
+    return hashlib.sha1(_answer_key(data if isinstance(data, list) else [data]).encode("utf-8")).hexdigest()
+
+
+def record_resolutions(session, results: List[dict]) -> Dict[str, int]:
+    """
+    以区间方式批量写入解析结果（不 commit，由调用方控制事务）。
+    results: resolve_dns() 的返回值，需额外带 cloud_resource_id
+    - 答案与当前区间相同：按主键批量 UPDATE，last_seen 取各自的 resolved_at
+    - 答案变化或首次出现：新插入一个区间
+    - 查询失败（res["error"] 非空）：不代表真实答案，既不开新区间也不延长当前区间
+    """
+    by_key: Dict[tuple, dict] = {}
+    for res in results:
+        key = (res["domain_name"], res["region"], res.get("record_type") or "A")
+        by_key[key] = res  # 同批次重复以最后一次为准
+
+    current = _latest_intervals(session, set(by_key))
+    extended: List[dict] = []
+    new_rows: List[dict] = []
+    failed = 0
+
+    for key, res in by_key.items():
+        if res.get("error"):
+            failed += 1
+            continue
+        answer = _answer_key(res.get("resolved_data"))
+        digest = hashlib.sha1(answer.encode("utf-8")).hexdigest()
+        when = _to_datetime(res.get("resolved_at"))
+
+        row = current.get(key)
+        if row is not None and _row_hash(row) == digest:
+            extended.append({"id": row.id, "last_seen": when})
+            continue
+        new_rows.append({
+            "id": res.get("id") or str(uuid.uuid4()),
+            "cloud_resource_id": res["cloud_resource_id"],
+            "domain_name": key[0],
+            "region": key[1],
+            "record_type": key[2],
+            "resolved_data": answer,
+            "answer_hash": digest,
+            "description": res.get("description"),
+            "resolved_at": when,
+            "first_seen": when,
+            "last_seen": when,
+        })
+
+    if extended:
+        # ORM 按主键批量 UPDATE（executemany），每行写入自己的 resolved_at
+        session.execute(update(ResolvedDnsRecord), extended, execution_options={"synchronize_session": False})
+    if new_rows:
+        session.execute(ResolvedDnsRecord.__table__.insert(), new_rows)
+
+    return {"inserted": len(new_rows), "extended": len(extended), "failed": failed}
+
+
+def lookup_resolution(session, domain_name: str, at: Optional[datetime] = None,
+                      region: str = "global", record_type: str = "A",
+                      strict: bool = True) -> Optional[ResolvedDnsRecord]:
+    """
+    “domain_name 在时间 at 解析到什么”；走 idx_resolved_lookup，at 为空时取最新区间。
+    strict=True 时只返回覆盖 at 的区间（first_seen <= at <= last_seen）；
+    strict=False 返回 at 之前开始的最近区间，由调用方根据 first_seen / last_seen 自行判断。
+    """
+    q = session.query(ResolvedDnsRecord).filter(
+        ResolvedDnsRecord.domain_name == domain_name,
+        ResolvedDnsRecord.region == region,
+        ResolvedDnsRecord.record_type == record_type,
+    )
+    if at is not None:
+        q = q.filter(ResolvedDnsRecord.first_seen <= at)
+    row = q.order_by(ResolvedDnsRecord.first_seen.desc()).first()
+    if strict and at is not None and row is not None and (row.last_seen is None or row.last_seen < at):
+        return None
+    return row
+
+
+def insert_resolved_dns_record(session, resolved: dict, cloud_resource_id: str):
+    record_resolutions(session, [dict(resolved, cloud_resource_id=cloud_resource_id)])
     session.commit()
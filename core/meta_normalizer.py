@@ -161,6 +161,7 @@ def normalize_ecs_aws(record: Dict[str, Any], **ctx) -> Dict[str, Any]:
             "instance_type": record.get("InstanceType"),
             "public_ip": record.get("PublicIpAddress", {}).get("PublicIp", []),
             "private_ip": record.get("PrivateIpAddress", {}),
+            "vpc_id": record.get("VpcId"),
         }
     })
     return _compact(base)
@@ -13,14 +13,20 @@ import uuid
 from datetime import datetime
 import enum
 import os
-import json
 from sqlalchemy import (
     create_engine, Column, String, DateTime, Enum,Index,
-    ForeignKey, Text, Integer, JSON
+    ForeignKey, Text, Integer, JSON, Computed, LargeBinary, inspect, text
 )
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.types import to_instance
 
 from pydantic import BaseModel
+from core.compression import CompressedText, CompactMetadataJSON, refresh_binary_state
+from core.serialization import dumps, loads
 from typing import Optional, Dict, Any
 
 Base = declarative_base()
@@ -80,7 +86,7 @@ class ResourceItem(BaseModel):
             zone=self.zone,
             domain_name=self.domain_name,
             vpc_id=self.vpc_id,
-            ip_addresses=json.dumps(self.ip_addresses),
+            ip_addresses=dumps(self.ip_addresses),
             status=self.status,
             tags=self.tags,
             resource_metadata=serialized_metadata,  # 使用序列化后的 metadata
@@ -88,6 +94,10 @@ class ResourceItem(BaseModel):
         )
 # ---------- MODELS ----------
 class ResolvedDnsRecord(Base):
+    """
+    解析历史按「区间」存储：同一 (domain_name, region, record_type) 的每个不同答案集合一行，
+    [first_seen, last_seen] 为该答案持续被观测到的时间段；答案不变时仅批量刷新 last_seen。
+    """
     __tablename__ = "resolved_dns_record"
 
     id = Column(String(36), primary_key=True)
@@ -95,10 +105,21 @@ class ResolvedDnsRecord(Base):
     domain_name = Column(String(255), nullable=False)
     region = Column(String(64), nullable=False)
     record_type = Column(String(10), default="A")
-    resolved_data = Column(Text, nullable=False)  # 存储 JSON 字串，如 ["1.1.1.1", "2.2.2.2"]
+    resolved_data = Column(CompressedText("resolved"), nullable=False)  # JSON 字串，如 ["1.1.1.1", "2.2.2.2"]（库内压缩）
+    answer_hash = Column(String(40))              # 排序后答案集合的 sha1，用于判断是否变化
     description = Column(Text)
-    resolved_at = Column(DateTime)
-    
+    resolved_at = Column(DateTime)                # 该区间首次解析时间（兼容旧字段，等于 first_seen）
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+
+    __table_args__ = (
+        # “X 在时间 T 解析到什么”：按 domain 定位后沿 first_seen 倒序取第一条
+        Index("idx_resolved_lookup", "domain_name", "region", "record_type", "first_seen"),
+        Index("idx_resolved_last_seen", "last_seen"),
+        Index("idx_resolved_resource", "cloud_resource_id"),
+    )
+
+
 class CloudAccount(Base):
     __tablename__ = "cloud_account"
 
@@ -114,6 +135,60 @@ class CloudAccount(Base):
     resources = relationship("CloudResource", back_populates="cloud_account")
 
 
+# ---------- 热点 metadata 路径 ----------
+# (列名, resource_metadata 内路径, 类型)。只在这里声明一次：建表时生成 STORED 生成列 + 索引，
+# 已有库由 ensure_hot_columns() 补列，query.py 的 meta.<path> 过滤自动改走对应列。
+HOT_METADATA_PATHS = [
+    ("meta_record_type", ("extra", "record_type"), String(16)),
+    ("meta_value", ("extra", "value"), String(512)),
+    ("meta_ttl", ("extra", "ttl"), Integer),
+    ("meta_instance_type", ("extra", "instance_type"), String(64)),
+]
+
+
+class JsonPathValue(ColumnElement):
+    """resource_metadata 内某路径的标量值；按方言编译为生成列表达式（JSON null / 类型不符时为 NULL）"""
+    inherit_cache = False
+
+    def __init__(self, path, type_):
+        self.path = tuple(path)
+        self.type = to_instance(type_)
+
+
+def _is_int(element) -> bool:
+    return isinstance(element.type, Integer)
+
+
+@compiles(JsonPathValue, "mysql")
+def _json_path_mysql(element, compiler, **kw):
+    x = f"JSON_EXTRACT(resource_metadata, '$.{'.'.join(element.path)}')"
+    if _is_int(element):
+        return f"(CASE WHEN JSON_TYPE({x}) = 'INTEGER' THEN CAST({x} AS SIGNED) END)"
+    return f"(CASE WHEN JSON_TYPE({x}) = 'NULL' THEN NULL ELSE LEFT(JSON_UNQUOTE({x}), {element.type.length}) END)"
+
+
+@compiles(JsonPathValue, "postgresql")
+def _json_path_postgresql(element, compiler, **kw):
+    p = "{" + ",".join(element.path) + "}"
+    if _is_int(element):
+        return (f"(CASE WHEN json_typeof(resource_metadata #> '{p}') = 'number' "
+                f"THEN (resource_metadata #>> '{p}')::numeric::integer END)")
+    return f"left(resource_metadata #>> '{p}', {element.type.length})"
+
+
+@compiles(JsonPathValue, "sqlite")
+def _json_path_sqlite(element, compiler, **kw):
+    p = f"'$.{'.'.join(element.path)}'"
+    if _is_int(element):
+        return f"(CASE WHEN json_type(resource_metadata, {p}) = 'integer' THEN json_extract(resource_metadata, {p}) END)"
+    return f"json_extract(resource_metadata, {p})"
+
+
+@compiles(JsonPathValue)
+def _json_path_default(element, compiler, **kw):
+    raise CompileError(f"不支持在该数据库上生成 metadata 列：{compiler.dialect.name}")
+
+
 class CloudResource(Base):
     __tablename__ = "cloud_resource"
 
@@ -130,11 +205,24 @@ class CloudResource(Base):
     vpc_id = Column(String(64))
     ip_addresses = Column(Text)    
     tags = Column(JSON, default={})
-    resource_metadata = Column(JSON, default={})  # ✅ renamed from 'metadata'
+    resource_metadata = Column(CompactMetadataJSON, default={})  # ✅ renamed from 'metadata'；provider_raw 库内压缩
     fetched_at = Column(DateTime, default=datetime.utcnow)
 
     cloud_account = relationship("CloudAccount", back_populates="resources")
 
+
+for _name, _path, _type in HOT_METADATA_PATHS:
+    setattr(CloudResource, _name, Column(_name, _type, Computed(JsonPathValue(_path, _type), persisted=True)))
+    Index(f"idx_cr_{_name}", CloudResource.__table__.c[_name])
+
+
+def hot_column_for(path):
+    """metadata 路径 -> 生成列（未声明的路径返回 None）"""
+    for name, p, _ in HOT_METADATA_PATHS:
+        if tuple(path) == p:
+            return getattr(CloudResource, name)
+    return None
+
 class ResourceRelationship(Base):
     __tablename__ = "resource_relationship"
 
@@ -146,6 +234,139 @@ class ResourceRelationship(Base):
     __table_args__ = (
         Index("idx_relation_src", "source_id"),
         Index("idx_relation_tgt", "target_id"),
+        Index("uq_relation", "source_id", "target_id", "relation_type", unique=True),
+    )
+
+
+class ResourceGraphState(Base):
+    """关系图增量构建状态：记录每个资源参与连边的键及其指纹，增量构建时未变化的资源直接复用，不重读 metadata"""
+    __tablename__ = "resource_graph_state"
+
+    resource_pk = Column(String(36), primary_key=True)  # cloud_resource.id
+    fingerprint = Column(String(40), nullable=False)
+    link_keys = Column(Text)  # JSON：[out 键列表, in 键列表]，指纹即其 sha1
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ResourceTag(Base):
+    """标签倒排索引：(tag_key, tag_value) -> cloud_resource.id，由写入端维护（见 core/tag_index.py）"""
+    __tablename__ = "resource_tag"
+
+    tag_key = Column(String(128), primary_key=True)
+    tag_value = Column(String(256), primary_key=True)
+    resource_pk = Column(String(36), primary_key=True)
+
+    __table_args__ = (
+        Index("idx_resource_tag_pk", "resource_pk"),
+    )
+
+
+class CompressionDict(Base):
+    """压缩字典（按 kind 训练，如 raw:dns_record / diff:ecs），见 core/compression.py"""
+    __tablename__ = "compression_dict"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(64), nullable=False)
+    algo = Column(String(8), nullable=False)   # s = zstd, z = zlib
+    data = Column(LargeBinary(length=2 ** 24 - 1), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class InventoryCounter(Base):
+    """看板计数汇总表：由写入端按批增量维护（见 core/summary.py），可随时全量重建"""
+    __tablename__ = "inventory_counter"
+
+    metric = Column(String(32), primary_key=True)    # records_per_zone / instances_per_region / ...
+    bucket = Column(String(256), primary_key=True)   # zone 名、provider/region、日期等
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CollectionRun(Base):
+    """一次采集运行的台账（见 core/run_ledger.py）；开始时插入，结束时回填汇总"""
+    __tablename__ = "collection_run"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job = Column(String(32), nullable=False, default="collect")   # collect / resolve / daemon ...
+    status = Column(String(16), nullable=False, default="running")  # running / success / failed
+    host = Column(String(128))
+    pid = Column(Integer)
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    tasks = Column(Integer, nullable=False, default=0)
+    api_calls = Column(Integer, nullable=False, default=0)
+    pages = Column(Integer, nullable=False, default=0)
+    records = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)     # 写入失败的行数
+    errors = Column(Integer, nullable=False, default=0)
+    throttles = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    __table_args__ = (
+        Index("idx_collection_run_started", "started_at"),
+    )
+
+
+class CollectionTask(Base):
+    """运行内每个 zone / region 任务一行；由台账在内存累计，批量插入"""
+    __tablename__ = "collection_task"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    run_id = Column(String(36), nullable=False)
+    provider = Column(String(32), nullable=False)
+    account_id = Column(String(64))
+    resource_type = Column(String(64), nullable=False)
+    scope = Column(String(16), nullable=False)    # zone / domain / region
+    target = Column(String(256), nullable=False)  # zone id / 域名 / region
+    target_name = Column(String(256))             # zone 名等可读名
+    status = Column(String(16), nullable=False)   # success / failed
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Integer)
+    api_calls = Column(Integer, nullable=False, default=0)
+    pages = Column(Integer, nullable=False, default=0)
+    records = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    throttles = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    __table_args__ = (
+        Index("idx_collection_task_run", "run_id"),
+        Index("idx_collection_task_target", "provider", "target", "started_at"),
+    )
+
+
+class WorkItem(Base):
+    """分布式采集的任务队列（见 core/work_queue.py）：协调者入队，worker 认领租约、心跳、完成"""
+    __tablename__ = "work_queue"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    run_id = Column(String(36), nullable=False)       # 协调者的一次分发
+    task_key = Column(String(256), nullable=False)    # provider|account|target，同一 run 内幂等入队
+    payload = Column(Text, nullable=False)            # JSON：plan_dns_tasks 产出的任务 dict
+    status = Column(String(16), nullable=False, default="pending")  # pending / leased / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    lease_owner = Column(String(128))                 # host:pid:线程
+    lease_expires_at = Column(DateTime)
+    enqueued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    result = Column(Text)                             # JSON：台账任务行的计数
+    error = Column(Text)
+
+    __table_args__ = (
+        Index("uq_work_queue_run_key", "run_id", "task_key", unique=True),
+        Index("idx_work_queue_claim", "status", "lease_expires_at"),
     )
 
 
@@ -158,14 +379,16 @@ class ResourceDiffLog(Base):
     region = Column(String(64))
     resource_type = Column(String(64), nullable=False)
     resource_id = Column(String(128), nullable=False)
-    changed_fields = Column(Text, nullable=False)  # JSON 格式字符串
-    raw_before = Column(Text)
-    raw_after = Column(Text)
+    zone = Column(String(64))                      # 同 cloud_resource.zone，便于按 zone 汇总
+    changed_fields = Column(Text, nullable=False)  # JSON：{"字段或 metadata 路径": {"old": ..., "new": ...}}
+    raw_before = Column(CompressedText("diff", kind_field="resource_type"))
+    raw_after = Column(CompressedText("diff", kind_field="resource_type"))
     changed_at = Column(DateTime, nullable=False)
 
     __table_args__ = (
         Index("idx_resource_diff_rid", "resource_id"),
         Index("idx_resource_diff_time", "changed_at"),
+        Index("idx_resource_diff_zone_time", "zone", "changed_at"),
     )
 
 
@@ -184,12 +407,114 @@ class DomainRecord(Base):
     status = Column(String(32))
     provider_raw = Column(JSON, default={})
     fetched_at = Column(DateTime, default=datetime.utcnow)
+    resource_pk = Column(String(36))  # 来源 cloud_resource.id；一条 DNS 资源的每个记录值一行（见 core/domain_records.py）
+
+    __table_args__ = (
+        Index("idx_domain_record_name", "name"),
+        Index("idx_domain_record_value", "value"),
+        Index("idx_domain_record_domain", "domain", "record_type"),
+        Index("idx_domain_record_resource", "resource_pk"),
+    )
 
 # ---------- INIT FUNCTIONS ----------
 
+def ensure_hot_columns(engine):
+    """
+    旧库补齐 HOT_METADATA_PATHS 生成列与索引（create_all 不会给已有表加列）。
+    MySQL / PostgreSQL 为 STORED；SQLite 的 ALTER TABLE 只能加 VIRTUAL 列，索引照样可用。
+    """
+    table = CloudResource.__table__
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    missing = [name for name, _, _ in HOT_METADATA_PATHS if name not in existing]
+    with engine.begin() as conn:
+        for name in missing:
+            ddl = str(CreateColumn(table.c[name]).compile(dialect=engine.dialect))
+            if engine.dialect.name == "sqlite":
+                ddl = ddl.replace(" STORED", " VIRTUAL")
+            print(f"  → 补充生成列 cloud_resource.{name}")
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        for idx in table.indexes:
+            if idx.name.startswith("idx_cr_meta_"):
+                idx.create(conn, checkfirst=True)
+    return missing
+
+
+def _add_missing_columns(engine, table, names):
+    """给已有表补普通可空列并补建该表索引（create_all 不会给已有表加列）；返回实际补上的列"""
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    missing = [name for name in names if name not in existing]
+    with engine.begin() as conn:
+        for name in missing:
+            ddl = str(CreateColumn(table.c[name]).compile(dialect=engine.dialect))
+            print(f"  → 补充列 {table.name}.{name}")
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        for idx in table.indexes:
+            idx.create(conn, checkfirst=True)
+    return missing
+
+
+def ensure_resolution_history_schema(engine):
+    """
+    旧版 resolved_dns_record 每次解析一行、没有区间列：补 answer_hash / first_seen / last_seen，
+    旧行回填为 first_seen = last_seen = resolved_at 的单点区间；answer_hash 留空，由写入时按 resolved_data 补算。
+    """
+    added = _add_missing_columns(engine, ResolvedDnsRecord.__table__, ["answer_hash", "first_seen", "last_seen"])
+    if "first_seen" in added or "last_seen" in added:
+        with engine.begin() as conn:
+            n = conn.execute(text(
+                "UPDATE resolved_dns_record SET first_seen = COALESCE(first_seen, resolved_at), "
+                "last_seen = COALESCE(last_seen, resolved_at) WHERE first_seen IS NULL OR last_seen IS NULL"
+            )).rowcount
+        print(f"  → 已回填 resolved_dns_record 区间列：{n} 行")
+    return added
+
+
+def ensure_diff_log_schema(engine):
+    """旧版 resource_diff_log 没有 zone：补列 + (zone, changed_at) 索引，并按 cloud_resource 回填已有行"""
+    added = _add_missing_columns(engine, ResourceDiffLog.__table__, ["zone"])
+    if added:
+        with engine.begin() as conn:
+            n = conn.execute(text(
+                "UPDATE resource_diff_log SET zone = (SELECT cr.zone FROM cloud_resource cr "
+                "WHERE cr.cloud_account_id = resource_diff_log.cloud_account_id "
+                "AND cr.resource_type = resource_diff_log.resource_type "
+                "AND cr.resource_id = resource_diff_log.resource_id LIMIT 1) WHERE zone IS NULL"
+            )).rowcount
+        print(f"  → 已回填 resource_diff_log.zone：{n} 行")
+    return added
+
+
+def ensure_graph_state_schema(engine):
+    """旧版 resource_graph_state 只有指纹：补 link_keys；为空的行在下次增量构建时重新抽取"""
+    return _add_missing_columns(engine, ResourceGraphState.__table__, ["link_keys"])
+
+
+def ensure_domain_record_schema(engine):
+    """旧版 domain_record 没有 resource_pk 且从未被写入：为空时直接按新结构重建"""
+    table = DomainRecord.__table__
+    if "resource_pk" in {c["name"] for c in inspect(engine).get_columns(table.name)}:
+        return False
+    with engine.begin() as conn:
+        if conn.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar():
+            raise RuntimeError("domain_record 为旧结构且已有数据，请先备份并清空该表")
+        table.drop(conn)
+        table.create(conn)
+    print("  → 已按新结构重建 domain_record")
+    return True
+
+
 def init_db(db_url="sqlite:///cloud_resources.db"):
-    engine = create_engine(db_url, echo=False, future=True)
+    # JSON 列（tags / resource_metadata）走统一序列化层
+    engine = create_engine(db_url, echo=False, future=True, json_serializer=dumps, json_deserializer=loads)
     Base.metadata.create_all(engine)
+    ensure_hot_columns(engine)
+    ensure_domain_record_schema(engine)
+    ensure_resolution_history_schema(engine)
+    ensure_diff_log_schema(engine)
+    ensure_graph_state_schema(engine)
+    pending = refresh_binary_state(engine)
+    if pending:
+        print(f"  → {', '.join(pending)} 仍为文本列，先按明文写入；运行 python -m core.compression migrate 在线改为二进制")
     return engine
 
 def get_session(engine):
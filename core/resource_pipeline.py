@@ -2,16 +2,30 @@
 # -*- coding: utf-8 -*-
 import os
 import re
-import json
+import time
+import atexit
 import hashlib
 import ipaddress
-from typing import Callable, List, Dict, Any, Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Dict, Any, Optional, Tuple
 
 from core.meta_normalizer import normalize_meta
+from core.serialization import dumps
+from utils import metrics
 
 # 环境开关：是否在入库前剥离上游原始报文，默认保留（设为 "0" 则剥离）
 STRIP_PROVIDER_RAW = os.getenv("STORE_PROVIDER_RAW", "1") == "0"
 
+# 进程池 normalize：PIPELINE_WORKERS>0 开启；少于 PIPELINE_POOL_MIN 条的批次仍在本进程处理
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "0"))
+PIPELINE_POOL_MIN = int(os.getenv("PIPELINE_POOL_MIN", "2000"))
+PIPELINE_CHUNK = int(os.getenv("PIPELINE_CHUNK", "300"))                      # 初始块大小（约一页）
+PIPELINE_CHUNK_SECONDS = float(os.getenv("PIPELINE_CHUNK_SECONDS", "0.05"))   # 自适应目标：每块耗时
+PIPELINE_MP_START = os.getenv("PIPELINE_MP_START", "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+CHUNK_MIN, CHUNK_MAX = 64, 8192
+
 
 # ----------------------------
 # resource_id 合成（各类型兜底保证稳定）
@@ -141,7 +155,7 @@ def _extract_ip_addresses(meta: Dict[str, Any], resource_type: str) -> Optional[
     for c in candidates:
         ips.extend(_collect_ips_from(c))
     ips = sorted(set(ips))
-    return json.dumps(ips, ensure_ascii=False) if ips else None
+    return dumps(ips) if ips else None
 
 
 # ----------------------------
@@ -159,43 +173,143 @@ def process_resources(
     ctx: account_id/region/status/tags/zone_id/zone_name/created_at/updated_at ...
     """
     items: List[Dict[str, Any]] = []
+    metrics.inc("pipeline_records_total", len(records), provider=provider, resource_type=resource_type)
+
+    with metrics.stage("process_resources"):
+        if PIPELINE_WORKERS > 0 and len(records) >= PIPELINE_POOL_MIN:
+            return _process_parallel(provider, resource_type, records, upsert_callback, ctx)
+        for rec in records:
+            items.append(_process_one(provider, resource_type, rec, upsert_callback, ctx))
+    return items
+
+
+# ----------------------------
+# 进程池执行
+# ----------------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_rec_cost: Dict[Tuple[str, str], float] = {}   # (provider, resource_type) -> 每条记录耗时（秒）的滑动平均
 
-    for rec in records:
-        meta = normalize_meta(provider, resource_type, rec, **ctx)
-
-        # 统一剥离 provider_raw（按需）
-        if STRIP_PROVIDER_RAW and "provider_raw" in meta:
-            meta.pop("provider_raw", None)
-
-        # 确保 resource_id 存在（合成兜底）
-        rid = _synthesize_resource_id(provider, resource_type, meta)
-        if rid:
-            meta["resource_id"] = rid
-
-        # zone/domain_name 映射到独立列（你的表结构）
-        extra = meta.get("extra") or {}
-        zone_id = extra.get("zone_id")
-        zone_name = extra.get("zone_name")
-
-        item: Dict[str, Any] = {
-            "provider": provider,
-            "account_id": ctx.get("account_id"),
-            "resource_type": resource_type,
-            "resource_id": meta.get("resource_id"),
-            "region": meta.get("region") or ctx.get("region"),
-            "status": meta.get("status"),
-            "name": meta.get("resource_name"),
-            "zone": zone_id,               # -> cloud_resource.zone
-            "domain_name": zone_name,      # -> cloud_resource.domain_name
-            "vpc_id": extra.get("vpc_id"),
-            "ip_addresses": _extract_ip_addresses(meta, resource_type),
-            "tags": meta.get("tags") or {},
-            "resource_metadata": meta,
-        }
-
-        if upsert_callback:
-            upsert_callback(item)
 
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(PIPELINE_WORKERS, mp_context=multiprocessing.get_context(PIPELINE_MP_START))
+    return _pool
+
+
+def _shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(_shutdown_pool)
+
+
+def _normalize_chunk(provider: str, resource_type: str, records: List[dict],
+                     ctx: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    子进程内执行：返回 (items, 耗时)。provider_raw 就是输入记录本身，一律不回传，
+    不剥离时由父进程用本地记录补回，回程不重复 pickle 原始报文。
+    """
+    t0 = time.perf_counter()
+    items = []
+    for rec in records:
+        item = _process_one(provider, resource_type, rec, None, ctx)
+        item["resource_metadata"].pop("provider_raw", None)
         items.append(item)
+    return items, time.perf_counter() - t0
+
+
+def _chunk_size(key: Tuple[str, str]) -> int:
+    cost = _rec_cost.get(key)
+    if not cost:
+        return PIPELINE_CHUNK
+    return max(CHUNK_MIN, min(CHUNK_MAX, int(PIPELINE_CHUNK_SECONDS / cost)))
+
 
+def _process_parallel(provider: str, resource_type: str, records: List[dict],
+                      upsert_callback: Optional[Callable[[Dict[str, Any]], None]],
+                      ctx: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    按块分发到进程池，按原顺序取回并在本进程调用 upsert_callback。
+    在途块数限制为 2×workers；块大小按实测的每条耗时向 PIPELINE_CHUNK_SECONDS 靠拢。
+    进程池异常时重建，失败的块在本进程补做。
+    """
+    key = (provider, resource_type)
+    items: List[Dict[str, Any]] = []
+    inflight: List[Tuple[int, int, Any]] = []   # (start, end, future)
+    pos = 0
+
+    def _collect(start: int, end: int, fut) -> None:
+        try:
+            chunk, secs = fut.result()
+        except BrokenProcessPool:
+            _shutdown_pool()
+            chunk = [_process_one(provider, resource_type, rec, None, ctx) for rec in records[start:end]]
+        else:
+            if end > start:
+                per = secs / (end - start)
+                prev = _rec_cost.get(key)
+                _rec_cost[key] = per if prev is None else prev * 0.7 + per * 0.3
+            if not STRIP_PROVIDER_RAW:
+                for item, rec in zip(chunk, records[start:end]):
+                    item["resource_metadata"] = {"provider_raw": rec, **item["resource_metadata"]}
+        for item in chunk:
+            if upsert_callback:
+                upsert_callback(item)
+            items.append(item)
+
+    while pos < len(records) or inflight:
+        while pos < len(records) and len(inflight) < 2 * PIPELINE_WORKERS:
+            end = min(len(records), pos + _chunk_size(key))
+            try:
+                fut = _get_pool().submit(_normalize_chunk, provider, resource_type, records[pos:end], ctx)
+            except BrokenProcessPool:
+                _shutdown_pool()
+                fut = _get_pool().submit(_normalize_chunk, provider, resource_type, records[pos:end], ctx)
+            inflight.append((pos, end, fut))
+            pos = end
+        _collect(*inflight.pop(0))
     return items
+
+
+def _process_one(provider: str, resource_type: str, rec: dict,
+                 upsert_callback: Optional[Callable[[Dict[str, Any]], None]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """单条记录：normalize -> 合成 resource_id -> item -> （可选）upsert"""
+    meta = normalize_meta(provider, resource_type, rec, **ctx)
+
+    # 统一剥离 provider_raw（按需）
+    if STRIP_PROVIDER_RAW and "provider_raw" in meta:
+        meta.pop("provider_raw", None)
+
+    # 确保 resource_id 存在（合成兜底）
+    rid = _synthesize_resource_id(provider, resource_type, meta)
+    if rid:
+        meta["resource_id"] = rid
+
+    # zone/domain_name 映射到独立列（你的表结构）
+    extra = meta.get("extra") or {}
+    zone_id = extra.get("zone_id")
+    zone_name = extra.get("zone_name")
+
+    item: Dict[str, Any] = {
+        "provider": provider,
+        "account_id": ctx.get("account_id"),
+        "resource_type": resource_type,
+        "resource_id": meta.get("resource_id"),
+        "region": meta.get("region") or ctx.get("region"),
+        "status": meta.get("status"),
+        "name": meta.get("resource_name"),
+        "zone": zone_id,               # -> cloud_resource.zone
+        "domain_name": zone_name,      # -> cloud_resource.domain_name
+        "vpc_id": extra.get("vpc_id"),
+        "ip_addresses": _extract_ip_addresses(meta, resource_type),
+        "tags": meta.get("tags") or {},
+        "resource_metadata": meta,
+    }
+
+    if upsert_callback:
+        upsert_callback(item)
+    return item
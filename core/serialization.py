@@ -0,0 +1,156 @@
+# core/serialization.py
+# -*- coding: utf-8 -*-
+"""
+统一 JSON 序列化层：装了 orjson 用 orjson，否则退回标准库；输出均为紧凑、非 ASCII 转义的 UTF-8。
+
+- dumps / loads：通用；engine 的 json_serializer 也指向这里（见 core.models.init_db）
+- canonical：键排序的规范形式，用于比较
+- ItemSerializer：diff 写入路径按资源缓存各字段的规范形式，比较与 raw_before / raw_after 复用同一份结果，
+  每个字段值每条资源最多序列化一次
+- `python -m core.serialization bench`：对比旧写法与新写法的单条序列化开销
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (set, frozenset)):
+        return sorted(v, key=str)
+    return str(v)
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default, option=_OPTS).decode("utf-8")
+
+    def canonical(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default, option=_OPTS | orjson.OPT_SORT_KEYS).decode("utf-8")
+
+    def loads(s):
+        return orjson.loads(s)
+else:
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def canonical(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=_default)
+
+    def loads(s):
+        return json.loads(s)
+
+
+def _as_list(v: Any) -> Any:
+    """ip_addresses 等以 JSON 文本存储的列表列：按内容比较，不受历史序列化格式（空格等）影响"""
+    if isinstance(v, str) and v[:1] == "[":
+        try:
+            return loads(v)
+        except ValueError:
+            return v
+    return v
+
+
+class ItemSerializer:
+    """单个 ORM 对象的字段级规范形式缓存"""
+
+    JSON_TEXT_FIELDS = ("ip_addresses",)
+
+    def __init__(self, obj):
+        self.obj = obj
+        self._cache: Dict[str, str] = {}
+
+    def canonical(self, field: str) -> str:
+        s = self._cache.get(field)
+        if s is None:
+            v = getattr(self.obj, field, None)
+            if field in self.JSON_TEXT_FIELDS:
+                v = _as_list(v)
+            s = self._cache[field] = canonical(v)
+        return s
+
+    def _fragment(self, field: str) -> str:
+        if field in self._cache and field not in self.JSON_TEXT_FIELDS:
+            return self._cache[field]
+        return dumps(getattr(self.obj, field, None))
+
+    def document(self, fields: Optional[Iterable[str]] = None) -> str:
+        """整行 JSON（raw_before / raw_after）；已比较过的字段直接拼接缓存片段"""
+        fields = fields or [c.key for c in self.obj.__table__.columns]
+        return "{" + ",".join(f"{dumps(f)}:{self._fragment(f)}" for f in fields) + "}"
+
+
+# ----------------------------
+# 基准
+# ----------------------------
+def _bench(n: int = 2000) -> Dict[str, Any]:
+    import time
+    import random
+    from core.models import CloudResource
+    from core.db_writer import COMPARE_FIELDS, obj_to_dict
+
+    def make(i: int, v: int) -> CloudResource:
+        raw = {"InstanceId": f"i-{i}", "InstanceType": "ecs.g6.large", "Cpu": 4, "Memory": 8192,
+               "VpcAttributes": {"VpcId": "vpc-1", "PrivateIpAddress": {"IpAddress": [f"10.0.{i % 250}.{v}"]}},
+               "Tags": {"Tag": [{"TagKey": "env", "TagValue": "prod"}]}, "Description": "x" * random.randint(0, 80)}
+        return CloudResource(
+            id=f"pk-{i}", cloud_account_id="acc", resource_type="ecs", resource_id=f"i-{i}", region="cn",
+            provider="aliyun", name=f"web-{i}", status="Running", vpc_id="vpc-1",
+            ip_addresses=dumps([f"10.0.{i % 250}.{v}"]), tags={"env": "prod"},
+            resource_metadata={"provider_raw": raw, "resource_type": "ecs",
+                               "extra": {"instance_type": "ecs.g6.large", "private_ip": [f"10.0.{i % 250}.{v}"]}},
+            fetched_at=datetime.utcnow(),
+        )
+
+    pairs = [(make(i, 1), make(i, 1 + (i % 2))) for i in range(n)]
+
+    def legacy(old, new):
+        def normalize(val):
+            if isinstance(val, (dict, list)):
+                return json.dumps(val, sort_keys=True, ensure_ascii=False)
+            return str(val)
+        changed = [f for f in COMPARE_FIELDS if normalize(getattr(old, f)) != normalize(getattr(new, f))]
+        if changed:
+            json.dumps(obj_to_dict(old), ensure_ascii=False)
+            json.dumps(obj_to_dict(new), ensure_ascii=False)
+
+    def current(old, new):
+        a, b = ItemSerializer(old), ItemSerializer(new)
+        changed = [f for f in COMPARE_FIELDS if a.canonical(f) != b.canonical(f)]
+        if changed:
+            a.document()
+            b.document()
+
+    out: Dict[str, Any] = {"backend": BACKEND, "items": n}
+    for name, fn in (("before", legacy), ("after", current)):
+        t0 = time.perf_counter()
+        for old, new in pairs:
+            fn(old, new)
+        out[f"{name}_us_per_item"] = round(1e6 * (time.perf_counter() - t0) / n, 1)
+    out["speedup"] = round(out["before_us_per_item"] / out["after_us_per_item"], 2)
+    return out
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="序列化层基准")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("-n", type=int, default=2000)
+    args = parser.parse_args()
+    json.dump(_bench(args.n), sys.stdout, ensure_ascii=False, indent=2)
+    print()
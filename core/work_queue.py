@@ -0,0 +1,499 @@
+# core/work_queue.py
+# -*- coding: utf-8 -*-
+"""
+分布式采集的租约任务队列：协调者把 zone / 域名 / region 任务入队，任意主机上的 N 个 worker 进程
+认领（lease）、心跳续租、完成；协调者等待全部结束后汇总。
+
+后端（接口一致，WQ_BACKEND 或 --queue 选择）：
+- db：现有数据库的 work_queue 表；认领用“读候选 + 带版本条件的 UPDATE”（attempts 作版本号），
+      MySQL / PostgreSQL / SQLite 通用，不依赖 SKIP LOCKED
+- redis：WQ_REDIS_URL；认领 / 续租 / 完成均为 Lua 脚本原子执行。worker 不区分 run，按全局 pending 顺序认领
+- memory：进程内实现，供单机多线程与测试使用
+
+语义：
+- 入队按 (run_id, task_key) 幂等，重复分发不会产生重复任务
+- 租约 WQ_LEASE_SECONDS 秒，worker 每 1/3 租期心跳；租约过期的任务回到可认领状态（attempts < max_attempts），
+  超过次数记为 failed。迟到的 complete / fail 因版本不符被拒绝，结果以新持有者为准
+- 心跳发现租约失效后，任务在下一次 check_lease()（写入端在分页 / 批量写入之间调用）抛 LeaseLost 中止，
+  不再继续采集和写库
+- 重试是安全的：写库走 insert_batch_or_log_diff（按 resource_id upsert），重跑同一 zone 结果一致
+- 时间取各主机本地 UTC，租期应远大于主机间时钟偏差
+"""
+import os
+import time
+import uuid
+import random
+import socket
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+from core.database import get_session
+from core.models import WorkItem
+from core.run_ledger import COUNTERS
+from core.serialization import dumps, loads
+from utils.logger import get_logger
+
+WQ_BACKEND = os.getenv("WQ_BACKEND", "db")
+WQ_REDIS_URL = os.getenv("WQ_REDIS_URL", "redis://localhost:6379/0")
+WQ_REDIS_PREFIX = os.getenv("WQ_REDIS_PREFIX", "wq")
+WQ_LEASE_SECONDS = float(os.getenv("WQ_LEASE_SECONDS", "300"))
+WQ_MAX_ATTEMPTS = int(os.getenv("WQ_MAX_ATTEMPTS", "3"))
+WQ_POLL_SECONDS = float(os.getenv("WQ_POLL_SECONDS", "2"))
+WQ_CLAIM_SCAN = 16     # 每次认领读取的候选数；多个 worker 在其中随机错开
+
+logger = get_logger(__name__)
+
+
+def task_key(task: Dict[str, Any]) -> str:
+    return "|".join(str(task.get(k) or "") for k in ("provider", "account_id", "resource_type", "target"))[:256]
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"[:128]
+
+
+class Lease:
+    __slots__ = ("id", "run_id", "task", "attempts", "owner", "lost")
+
+    def __init__(self, id: str, run_id: str, task: Dict[str, Any], attempts: int, owner: str):
+        self.id = id
+        self.run_id = run_id
+        self.task = task
+        self.attempts = attempts
+        self.owner = owner
+        self.lost = False
+
+
+class LeaseLost(RuntimeError):
+    """当前任务的租约已失效（已被回收 / 转给其他 worker），应中止且不再写入"""
+
+
+_current_lease: ContextVar[Optional[Lease]] = ContextVar("work_queue_lease", default=None)
+
+
+def check_lease() -> None:
+    """当前线程正在执行的任务租约已失效时抛 LeaseLost；不在 worker 中执行时为空操作"""
+    lease = _current_lease.get()
+    if lease is not None and lease.lost:
+        raise LeaseLost(f"租约已失效：{lease.id}")
+
+
+# ----------------------------
+# 数据库
+# ----------------------------
+class DBQueue:
+    def __init__(self, max_attempts: int = WQ_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+
+    def enqueue(self, run_id: str, tasks: Iterable[Dict[str, Any]]) -> int:
+        w = WorkItem
+        rows = {task_key(t): t for t in tasks}
+        sess = get_session()
+        try:
+            existing = {k for (k,) in sess.execute(select(w.task_key).where(w.run_id == run_id))}
+            new = [{"id": str(uuid.uuid4()), "run_id": run_id, "task_key": k,
+                    "payload": dumps(t), "status": "pending", "attempts": 0, "max_attempts": self.max_attempts,
+                    "enqueued_at": datetime.utcnow()} for k, t in rows.items() if k not in existing]
+            if new:
+                sess.execute(w.__table__.insert(), new)
+            sess.commit()
+            return len(new)
+        finally:
+            sess.close()
+
+    @staticmethod
+    def _ready(now: datetime):
+        w = WorkItem
+        return and_(w.attempts < w.max_attempts,
+                    or_(w.status == "pending", and_(w.status == "leased", w.lease_expires_at < now)))
+
+    @staticmethod
+    def _reap(sess, now: datetime) -> None:
+        """租约过期且次数用尽的任务记为 failed"""
+        w = WorkItem
+        sess.execute(update(w).where(w.status == "leased", w.lease_expires_at < now, w.attempts >= w.max_attempts)
+                     .values(status="failed", finished_at=now, error="租约过期且重试次数用尽")
+                     .execution_options(synchronize_session=False))
+
+    def claim(self, owner: str, lease_secs: float = WQ_LEASE_SECONDS, run_id: Optional[str] = None) -> Optional[Lease]:
+        w = WorkItem
+        now = datetime.utcnow()
+        sess = get_session()
+        try:
+            self._reap(sess, now)
+            stmt = select(w.id, w.run_id, w.attempts, w.payload).where(self._ready(now))
+            if run_id:
+                stmt = stmt.where(w.run_id == run_id)
+            cands = sess.execute(stmt.order_by(w.enqueued_at).limit(WQ_CLAIM_SCAN)).all()
+            random.shuffle(cands)
+            for c in cands:
+                res = sess.execute(
+                    update(w).where(w.id == c.id, w.attempts == c.attempts, self._ready(now))
+                    .values(status="leased", lease_owner=owner, attempts=c.attempts + 1, started_at=now,
+                            lease_expires_at=now + timedelta(seconds=lease_secs))
+                    .execution_options(synchronize_session=False))
+                if res.rowcount == 1:
+                    sess.commit()
+                    return Lease(c.id, c.run_id, loads(c.payload), c.attempts + 1, owner)
+            sess.commit()
+            return None
+        finally:
+            sess.close()
+
+    def _guarded(self, lease: Lease, **values) -> bool:
+        w = WorkItem
+        sess = get_session()
+        try:
+            res = sess.execute(update(w).where(w.id == lease.id, w.status == "leased", w.lease_owner == lease.owner,
+                                               w.attempts == lease.attempts)
+                               .values(**values).execution_options(synchronize_session=False))
+            sess.commit()
+            return res.rowcount == 1
+        finally:
+            sess.close()
+
+    def heartbeat(self, lease: Lease, lease_secs: float = WQ_LEASE_SECONDS) -> bool:
+        return self._guarded(lease, lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_secs))
+
+    def complete(self, lease: Lease, result: Dict[str, Any]) -> bool:
+        return self._guarded(lease, status="done", finished_at=datetime.utcnow(), result=dumps(result), error=None)
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        retry = lease.attempts < self.max_attempts
+        return self._guarded(lease, status="pending" if retry else "failed", lease_expires_at=None,
+                             finished_at=None if retry else datetime.utcnow(), error=error[:2000])
+
+    def items(self, run_id: str) -> List[Dict[str, Any]]:
+        w = WorkItem
+        sess = get_session()
+        try:
+            self._reap(sess, datetime.utcnow())
+            sess.commit()
+            rows = sess.execute(select(w.task_key, w.status, w.attempts, w.lease_owner, w.result, w.error)
+                                .where(w.run_id == run_id)).all()
+            return [{"task_key": r.task_key, "status": r.status, "attempts": r.attempts, "owner": r.lease_owner,
+                     "result": loads(r.result) if r.result else None, "error": r.error} for r in rows]
+        finally:
+            sess.close()
+
+
+# ----------------------------
+# Redis
+# ----------------------------
+_REDIS_REAP = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, k in ipairs(expired) do
+  redis.call('ZREM', KEYS[2], k)
+  if tonumber(redis.call('HGET', KEYS[4], k) or '0') < tonumber(ARGV[2]) then
+    redis.call('RPUSH', KEYS[1], k)
+    redis.call('HSET', KEYS[5], k, 'pending')
+  else
+    redis.call('HSET', KEYS[5], k, 'failed')
+    redis.call('HSET', KEYS[6], k, 'lease expired')
+  end
+end
+"""
+
+# KEYS: pending, leases, owner, attempts, status, error   ARGV: now, max_attempts, expires, owner
+_REDIS_CLAIM = _REDIS_REAP + """
+local k = redis.call('LPOP', KEYS[1])
+if not k then return false end
+local n = redis.call('HINCRBY', KEYS[4], k, 1)
+redis.call('ZADD', KEYS[2], ARGV[3], k)
+redis.call('HSET', KEYS[3], k, ARGV[4] .. '#' .. n)
+redis.call('HSET', KEYS[5], k, 'leased')
+return {k, n}
+"""
+
+# KEYS: leases, owner, status, pending, field_hash   ARGV: id, owner#attempts, action, expires|value, status
+_REDIS_GUARDED = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] or redis.call('HGET', KEYS[3], ARGV[1]) ~= 'leased' then
+  return 0
+end
+if ARGV[3] == 'heartbeat' then
+  redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+  return 1
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[5], ARGV[1], ARGV[4])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[5])
+if ARGV[5] == 'pending' then
+  redis.call('RPUSH', KEYS[4], ARGV[1])
+end
+return 1
+"""
+
+# KEYS: task, run_set, pending, status   ARGV: id, payload
+_REDIS_ENQUEUE = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then return 0 end
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('RPUSH', KEYS[3], ARGV[1])
+redis.call('HSET', KEYS[4], ARGV[1], 'pending')
+return 1
+"""
+
+
+class RedisQueue:
+    def __init__(self, url: str = WQ_REDIS_URL, max_attempts: int = WQ_MAX_ATTEMPTS, prefix: str = WQ_REDIS_PREFIX):
+        import redis   # 可选依赖，仅 redis 后端需要
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.max_attempts = max_attempts
+        self.k = {n: f"{prefix}:{n}" for n in ("task", "pending", "leases", "owner", "attempts", "status",
+                                                "result", "error")}
+        self.prefix = prefix
+        self._claim = self.r.register_script(_REDIS_CLAIM)
+        self._reap = self.r.register_script(_REDIS_REAP + "\nreturn 1")
+        self._guarded_script = self.r.register_script(_REDIS_GUARDED)
+        self._enqueue = self.r.register_script(_REDIS_ENQUEUE)
+
+    def _state_keys(self) -> List[str]:
+        k = self.k
+        return [k["pending"], k["leases"], k["owner"], k["attempts"], k["status"], k["error"]]
+
+    def enqueue(self, run_id: str, tasks: Iterable[Dict[str, Any]]) -> int:
+        keys = [self.k["task"], f"{self.prefix}:run:{run_id}", self.k["pending"], self.k["status"]]
+        n = 0
+        for t in tasks:
+            payload = dumps({"run_id": run_id, "task": t})
+            n += int(self._enqueue(keys=keys, args=[f"{run_id}:{task_key(t)}", payload]))
+        return n
+
+    def claim(self, owner: str, lease_secs: float = WQ_LEASE_SECONDS, run_id: Optional[str] = None) -> Optional[Lease]:
+        now = time.time()
+        got = self._claim(keys=self._state_keys(), args=[now, self.max_attempts, now + lease_secs, owner])
+        if not got:
+            return None
+        tid, attempts = got[0], int(got[1])
+        doc = loads(self.r.hget(self.k["task"], tid))
+        return Lease(tid, doc["run_id"], doc["task"], attempts, owner)
+
+    def _guarded(self, lease: Lease, action: str, field: str, value: Any, status: str = "") -> bool:
+        keys = [self.k["leases"], self.k["owner"], self.k["status"], self.k["pending"], self.k[field]]
+        return bool(self._guarded_script(keys=keys, args=[lease.id, f"{lease.owner}#{lease.attempts}",
+                                                          action, value, status]))
+
+    def heartbeat(self, lease: Lease, lease_secs: float = WQ_LEASE_SECONDS) -> bool:
+        return self._guarded(lease, "heartbeat", "leases", time.time() + lease_secs)
+
+    def complete(self, lease: Lease, result: Dict[str, Any]) -> bool:
+        return self._guarded(lease, "finish", "result", dumps(result), "done")
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        retry = lease.attempts < self.max_attempts
+        return self._guarded(lease, "finish", "error", error[:2000], "pending" if retry else "failed")
+
+    def items(self, run_id: str) -> List[Dict[str, Any]]:
+        self._reap(keys=self._state_keys(), args=[time.time(), self.max_attempts])
+        ids = sorted(self.r.smembers(f"{self.prefix}:run:{run_id}"))
+        if not ids:
+            return []
+        p = self.r.pipeline(transaction=False)
+        for name in ("status", "attempts", "owner", "result", "error"):
+            p.hmget(self.k[name], ids)
+        status, attempts, owner, result, error = p.execute()
+        return [{"task_key": tid.split(":", 1)[1], "status": status[i], "attempts": int(attempts[i] or 0),
+                 "owner": (owner[i] or "").rsplit("#", 1)[0] or None,
+                 "result": loads(result[i]) if result[i] else None, "error": error[i]}
+                for i, tid in enumerate(ids)]
+
+
+# ----------------------------
+# 进程内
+# ----------------------------
+class MemoryQueue:
+    """与 DBQueue 同语义的进程内实现（单机多线程 / 测试）"""
+    def __init__(self, max_attempts: int = WQ_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._items: Dict[str, Dict[str, Any]] = {}
+
+    def enqueue(self, run_id: str, tasks: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        with self._lock:
+            for t in tasks:
+                tid = f"{run_id}:{task_key(t)}"
+                if tid not in self._items:
+                    self._items[tid] = {"run_id": run_id, "task": t, "status": "pending", "attempts": 0, "owner": None,
+                                        "expires": 0.0, "seq": len(self._items), "result": None, "error": None}
+                    n += 1
+        return n
+
+    def _reap(self, now: float) -> None:
+        for it in self._items.values():
+            if it["status"] == "leased" and it["expires"] < now and it["attempts"] >= self.max_attempts:
+                it.update(status="failed", error="租约过期且重试次数用尽")
+
+    def claim(self, owner: str, lease_secs: float = WQ_LEASE_SECONDS, run_id: Optional[str] = None) -> Optional[Lease]:
+        now = time.monotonic()
+        with self._lock:
+            self._reap(now)
+            ready = [(it["seq"], tid) for tid, it in self._items.items()
+                     if (run_id is None or it["run_id"] == run_id) and it["attempts"] < self.max_attempts
+                     and (it["status"] == "pending" or (it["status"] == "leased" and it["expires"] < now))]
+            if not ready:
+                return None
+            tid = min(ready)[1]
+            it = self._items[tid]
+            it.update(status="leased", owner=owner, attempts=it["attempts"] + 1, expires=now + lease_secs)
+            return Lease(tid, it["run_id"], it["task"], it["attempts"], owner)
+
+    def _guarded(self, lease: Lease, **values) -> bool:
+        with self._lock:
+            it = self._items.get(lease.id)
+            if not it or it["status"] != "leased" or it["owner"] != lease.owner or it["attempts"] != lease.attempts:
+                return False
+            it.update(values)
+            return True
+
+    def heartbeat(self, lease: Lease, lease_secs: float = WQ_LEASE_SECONDS) -> bool:
+        return self._guarded(lease, expires=time.monotonic() + lease_secs)
+
+    def complete(self, lease: Lease, result: Dict[str, Any]) -> bool:
+        return self._guarded(lease, status="done", result=result, error=None)
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        return self._guarded(lease, status="pending" if lease.attempts < self.max_attempts else "failed", error=error)
+
+    def items(self, run_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._reap(time.monotonic())
+            return [{"task_key": tid.split(":", 1)[1], "status": it["status"], "attempts": it["attempts"],
+                     "owner": it["owner"], "result": it["result"], "error": it["error"]}
+                    for tid, it in self._items.items() if it["run_id"] == run_id]
+
+
+def open_queue(backend: Optional[str] = None, max_attempts: int = WQ_MAX_ATTEMPTS):
+    backend = (backend or WQ_BACKEND).lower()
+    if backend == "db":
+        return DBQueue(max_attempts)
+    if backend == "redis":
+        return RedisQueue(max_attempts=max_attempts)
+    if backend == "memory":
+        return MemoryQueue(max_attempts)
+    raise ValueError(f"未知的队列后端: {backend}")
+
+
+# ----------------------------
+# worker / 协调者
+# ----------------------------
+def _result(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not row:
+        return {}
+    out = {k: row.get(k, 0) for k in COUNTERS}
+    out["duration_ms"] = row.get("duration_ms")
+    return out
+
+
+class Worker:
+    """
+    循环：认领 -> 执行 run(task) -> complete / fail；后台线程按 1/3 租期续租。
+    续租失败（租约被判过期并转给别人）时标记 lease.lost，任务在下一次 check_lease() 抛 LeaseLost 中止，
+    不再写库，也不提交 complete / fail；即便任务已跑完，结果提交也会因租约不符被拒绝。
+    """
+    def __init__(self, queue, run: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                 run_id: Optional[str] = None, lease_secs: float = WQ_LEASE_SECONDS,
+                 stop_event: Optional[threading.Event] = None):
+        self.queue = queue
+        self.run = run
+        self.run_id = run_id
+        self.lease_secs = lease_secs
+        self.stop_event = stop_event or threading.Event()
+        self.stats = {"done": 0, "failed": 0, "lost": 0}
+        self._lease: Optional[Lease] = None
+        self._lease_lock = threading.Lock()
+        self._idle = threading.Event()
+
+    def _heartbeat(self) -> None:
+        while not self._idle.wait(self.lease_secs / 3):
+            with self._lease_lock:
+                lease = self._lease
+            if lease is None or lease.lost:
+                continue
+            try:
+                if not self.queue.heartbeat(lease, self.lease_secs):
+                    lease.lost = True
+                    logger.warning("租约已失效：%s", lease.id, extra={"lease": lease.id})
+            except Exception as e:
+                logger.error("心跳失败: %s", e)
+
+    def _execute(self, lease: Lease) -> None:
+        with self._lease_lock:
+            self._lease = lease
+        token = _current_lease.set(lease)
+        try:
+            row = self.run(lease.task)
+        except LeaseLost:
+            ok = False  # 任务已归新持有者，不提交 fail
+        except Exception as e:
+            ok = self.queue.fail(lease, f"{type(e).__name__}: {e}")
+            self.stats["failed"] += 1
+            logger.error("任务失败（第 %d 次）：%s: %s", lease.attempts, lease.task.get("target_name"), e,
+                         extra={"lease": lease.id, "attempts": lease.attempts})
+        else:
+            ok = self.queue.complete(lease, _result(row))
+            self.stats["done"] += 1
+        finally:
+            _current_lease.reset(token)
+            with self._lease_lock:
+                self._lease = None
+        if not ok:
+            self.stats["lost"] += 1
+            logger.warning("结果未提交（租约已转给其他 worker）：%s", lease.id, extra={"lease": lease.id})
+
+    def serve(self, owner: Optional[str] = None, exit_when_idle: bool = False) -> Dict[str, int]:
+        owner = owner or worker_id()
+        hb = threading.Thread(target=self._heartbeat, name="wq-heartbeat", daemon=True)
+        hb.start()
+        try:
+            while not self.stop_event.is_set():
+                lease = self.queue.claim(owner, self.lease_secs, self.run_id)
+                if lease is None:
+                    if exit_when_idle and (self.run_id is None or not outstanding(self.queue, self.run_id)):
+                        break
+                    self.stop_event.wait(WQ_POLL_SECONDS)
+                    continue
+                self._execute(lease)
+        finally:
+            self._idle.set()
+            hb.join(timeout=1)
+        return self.stats
+
+
+def outstanding(queue, run_id: str) -> int:
+    return sum(1 for it in queue.items(run_id) if it["status"] in ("pending", "leased"))
+
+
+def wait(queue, run_id: str, stop_event: Optional[threading.Event] = None, poll: float = WQ_POLL_SECONDS) -> bool:
+    """等到 run 内没有 pending / leased 任务；被 stop_event 打断时返回 False"""
+    stop_event = stop_event or threading.Event()
+    while outstanding(queue, run_id):
+        if stop_event.wait(poll):
+            return False
+    return True
+
+
+def summarize(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总一个 run：各状态任务数、重试数、各 worker 完成数、台账计数之和、失败明细"""
+    out: Dict[str, Any] = {"tasks": len(items), "done": 0, "failed": 0, "pending": 0, "leased": 0, "retried": 0}
+    totals = dict.fromkeys(COUNTERS, 0)
+    workers: Dict[str, int] = {}
+    failures = []
+    for it in items:
+        out[it["status"]] = out.get(it["status"], 0) + 1
+        if it["attempts"] > 1:
+            out["retried"] += 1
+        if it["status"] == "done":
+            host = (it["owner"] or "?").rsplit(":", 1)[0]   # host:pid
+            workers[host] = workers.get(host, 0) + 1
+            for k in COUNTERS:
+                totals[k] += (it["result"] or {}).get(k, 0) or 0
+        elif it["status"] == "failed":
+            failures.append({"task": it["task_key"], "attempts": it["attempts"], "error": it["error"]})
+    out.update(totals)
+    out["workers"] = workers
+    out["failures"] = failures
+    return out
@@ -1,6 +1,6 @@
 # init_db.py
 
-from core.models import Base  # 只要 Base 定义包含全部 model，这样就能全部建表
+from core.models import Base, ensure_hot_columns  # 只要 Base 定义包含全部 model，这样就能全部建表
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.engine import Engine
@@ -67,22 +67,11 @@ def create_indexes(engine: Engine):
         safe_create_index("idx_region_zone", "CREATE INDEX idx_region_zone ON cloud_resource(region, zone)")
         safe_create_index("idx_fetched_at", "CREATE INDEX idx_fetched_at ON cloud_resource(fetched_at)")
         safe_create_index("uq_resource", "ALTER TABLE cloud_resource ADD UNIQUE KEY uq_resource (cloud_account_id, resource_type, resource_id)")
-        if backend.startswith("postgresql"):
-            print("🔧 创建 PostgreSQL GIN 索引...")
-            safe_create_index("idx_metadata_domain_name", """
-                CREATE INDEX idx_metadata_domain_name ON cloud_resource 
-                USING GIN ((resource_metadata->>'domain_name'))
-            """)
-            safe_create_index("idx_metadata_instance_type", """
-                CREATE INDEX idx_metadata_instance_type ON cloud_resource 
-                USING GIN ((resource_metadata->>'InstanceType'))
-            """)
-            safe_create_index("idx_metadata_ip", """
-                CREATE INDEX idx_metadata_ip ON cloud_resource 
-                USING GIN ((resource_metadata->'InnerIpAddress'->'IpAddress'))
-            """)
-        else:
-            print("⚠️  当前数据库不支持 GIN 索引，跳过 JSON 索引")
+        conn.commit()
+
+    # resource_metadata 热点路径：各后端统一使用生成列 + B-tree 索引（路径声明见 core.models.HOT_METADATA_PATHS）
+    print("🔧 创建 metadata 生成列与索引...")
+    ensure_hot_columns(engine)
 
 
 def reset_tables(db_url: str):
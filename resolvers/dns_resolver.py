@@ -11,14 +11,21 @@ Version: 1.0
 """
 
 import dns.resolver
+import time
 import uuid
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 
+from utils import metrics
 
-def resolve_dns(domain: str, region: str = "global", record_type: str = "A", description: str = "") -> Dict:
+
+def resolve_dns(domain: str, region: str = "global", record_type: str = "A", description: str = "",
+                nameservers: Optional[List[str]] = None, port: int = 53) -> Dict:
     """
     解析指定 domain，返回真实记录
+    nameservers / port：覆盖按 region 选择的 DNS server（基准测试指向本地 stub）
+    error：查询失败（超时、无可用 DNS server 等）时为错误信息，此时 resolved_data 不代表真实答案；
+           NXDOMAIN / NoAnswer 属于权威的“无记录”，error 为 None、resolved_data 为 []
     """
     result = {
         "id": str(uuid.uuid4()),
@@ -26,6 +33,7 @@ def resolve_dns(domain: str, region: str = "global", record_type: str = "A", des
         "region": region,
         "record_type": record_type,
         "resolved_data": [],
+        "error": None,
         "description": description,
         "resolved_at": datetime.utcnow().isoformat()
     }
@@ -43,13 +51,23 @@ def resolve_dns(domain: str, region: str = "global", record_type: str = "A", des
     resolver.timeout = 3
     resolver.lifetime = 5
 
-    resolver.nameservers = dns_servers.get(region, dns_servers["global"])
+    resolver.nameservers = nameservers or dns_servers.get(region, dns_servers["global"])
+    resolver.port = port
 
+    outcome = "ok"
+    t0 = time.perf_counter()
     try:
         answers = resolver.resolve(domain, record_type)
         result["resolved_data"] = [r.to_text() for r in answers]
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as e:
+        outcome = type(e).__name__
+        result["description"] += f" (no record: {e})"
     except Exception as e:
+        outcome = type(e).__name__
+        result["error"] = f"{outcome}: {e}"
         result["description"] += f" (resolve error: {e})"
+    metrics.observe("resolver_query_seconds", time.perf_counter() - t0, region=region, record_type=record_type)
+    metrics.inc("resolver_queries_total", region=region, record_type=record_type, outcome=outcome)
 
     return result
 
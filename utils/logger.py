@@ -6,7 +6,175 @@ Function: 统一日志实例初始化模块
 Author  : Ericseway
 Email   : devopjj@gmail.com
 Created : 2025-08-04 , 10:45
-Modified: 2025-08-04 , 10:45
-Version : 1.0
+Modified: 2026-10-19 , 10:00
+Version : 1.1
+
+- 业务线程只把 LogRecord 放进队列（QueueHandler），格式化与 I/O 由后台 QueueListener 完成
+- 结构化 JSON 输出（LOG_FORMAT=text 可切回单行文本），自动带上 bind() 绑定的 run_id / provider / zone 等上下文
+- 用 %-参数的惰性格式化：logger.debug("upsert %s", rid) 在 DEBUG 关闭时只做一次级别判断
+- 环境变量：LOG_LEVEL（默认 INFO）、LOG_FORMAT（json|text，默认 json）、LOG_DIR（设置后额外写滚动文件）
+
+    from utils.logger import get_logger, bind
+    logger = get_logger(__name__)
+    with bind(run_id=run_id, provider="aws", zone=zone_name):
+        logger.info("zone 采集完成: %d 条", n, extra={"records": n})
 """
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_DIR = os.getenv("LOG_DIR", "")
+ROOT = "cloud"
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+# LogRecord 自带属性；其余（extra=... 传入的）视为结构化字段
+_STD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "ctx"}
+
+
+# ----------------------------
+# 上下文
+# ----------------------------
+@contextmanager
+def bind(**fields: Any):
+    """在当前线程 / 上下文内为之后的日志附加字段（可嵌套，内层覆盖外层）"""
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def context() -> Dict[str, Any]:
+    return dict(_context.get())
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    在调用线程里完成必须同步做的事：抓上下文、合并 msg % args、展开异常栈；
+    之后 record 不再引用调用方对象，可安全跨线程。
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.ctx = _context.get()
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+
+# ----------------------------
+# 格式化（在监听线程里执行）
+# ----------------------------
+def _ts(record: logging.LogRecord) -> str:
+    return datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    out = dict(getattr(record, "ctx", None) or {})
+    for k, v in vars(record).items():
+        if k not in _STD_ATTRS:
+            out[k] = v
+    return out
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {"ts": _ts(record), "level": record.levelname, "logger": record.name,
+               "thread": record.threadName, "msg": record.getMessage()}
+        doc.update(_fields(record))
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = _fields(record)
+        kv = " ".join(f"{k}={v}" for k, v in fields.items())
+        line = f"{_ts(record)} {record.levelname:<7} {record.name}: {record.getMessage()}" + (f"  [{kv}]" if kv else "")
+        return line + ("\n" + record.exc_text if record.exc_text else "")
+
+
+# ----------------------------
+# 初始化
+# ----------------------------
+def setup(level: Optional[str] = None, fmt: Optional[str] = None, log_dir: Optional[str] = None,
+          stream=None, force: bool = False) -> logging.Logger:
+    """
+    配置 "cloud" 根 logger：QueueHandler -> 后台 QueueListener -> stderr（+ 可选滚动文件）。
+    重复调用为空操作，force=True 时按新参数重建。
+    """
+    global _listener
+    root = logging.getLogger(ROOT)
+    with _setup_lock:
+        if _listener is not None and not force:
+            return root
+        if _listener is not None:
+            shutdown()
+
+        formatter = TextFormatter() if (fmt or LOG_FORMAT) == "text" else JsonFormatter()
+        handlers = [logging.StreamHandler(stream or sys.stderr)]
+        log_dir = LOG_DIR if log_dir is None else log_dir
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            handlers.append(RotatingFileHandler(os.path.join(log_dir, "cloud_resource_mgmt.log"),
+                                                maxBytes=50 * 1024 * 1024, backupCount=5, encoding="utf-8"))
+        for h in handlers:
+            h.setFormatter(formatter)
+
+        q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root.handlers[:] = [_ContextQueueHandler(q)]
+        root.setLevel((level or LOG_LEVEL).upper())
+        root.propagate = False
+        _listener = QueueListener(q, *handlers, respect_handler_level=True)
+        _listener.start()
+    return root
+
+
+def shutdown() -> None:
+    """停止监听线程并排空队列（进程退出时自动调用）"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        finally:
+            for h in _listener.handlers:
+                h.close()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def console_handlers() -> List[logging.StreamHandler]:
+    """写 stdout / stderr 的 handler（不含滚动文件）；utils/progress 在终端刷新进度时替换其 stream"""
+    handlers = list(_listener.handlers) if _listener is not None else []
+    handlers += logging.getLogger().handlers
+    return [h for h in handlers if type(h) is logging.StreamHandler]
+
 
+def get_logger(name: str = "") -> logging.Logger:
+    """返回 "cloud" 下的子 logger；首次调用时按环境变量完成初始化"""
+    if _listener is None:
+        setup()
+    if not name or name == ROOT:
+        return logging.getLogger(ROOT)
+    return logging.getLogger(name if name.startswith(ROOT + ".") else f"{ROOT}.{name}")
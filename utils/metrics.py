@@ -0,0 +1,319 @@
+# utils/metrics.py
+# -*- coding: utf-8 -*-
+"""
+轻量指标：计数器 / 直方图 / gauge，按 Prometheus 文本格式导出。
+
+- 开关：METRICS_TEXTFILE=<路径>（运行结束写 textfile，供 node_exporter textfile collector 采集）
+        METRICS_PORT=<端口>（本地起 /metrics）
+        METRICS=1（仅进程内收集）；都未设置时关闭，所有埋点退化为空操作
+- 埋点：
+    with metrics.stage("collect"):            # 阶段可嵌套，标签为 collect/normalize 这样的路径
+        ...
+    with metrics.api_call("aws", "list_resource_record_sets", account_id):
+        ...
+    for page in metrics.timed_iter(paginator.paginate(...), "aws", "list_resource_record_sets", account_id):
+        ...
+    metrics.inc("pipeline_records_total", n, provider="aws", resource_type="dns_record")
+- 导出：render() / write_textfile() / serve()；main.py 中 start() + flush()
+"""
+import os
+import sys
+import time
+import atexit
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+ENABLED = bool(METRICS_TEXTFILE or METRICS_PORT or os.getenv("METRICS", "0") == "1")
+
+# 秒；覆盖单条 DNS 查询到整轮采集
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+HELP = {
+    "cloud_api_calls_total": ("counter", "云 API 调用次数"),
+    "cloud_api_errors_total": ("counter", "云 API 调用失败次数"),
+    "cloud_api_latency_seconds": ("histogram", "云 API 单次调用耗时"),
+    "pipeline_stage_seconds": ("histogram", "采集管道各阶段耗时（stage 为层级路径）"),
+    "pipeline_records_total": ("counter", "进入 process_resources 的记录数"),
+    "db_flush_seconds": ("histogram", "批量写入一次 flush + commit 的耗时"),
+    "db_flush_rows_total": ("counter", "批量写入的行数（按结果）"),
+    "resolver_query_seconds": ("histogram", "DNS 解析单次查询耗时"),
+    "resolver_queries_total": ("counter", "DNS 解析次数（按结果）"),
+    "run_last_success_timestamp_seconds": ("gauge", "最近一次成功完成的运行时间"),
+    "scheduler_due_tasks": ("gauge", "常驻调度：当前已到期未执行的任务数"),
+    "scheduler_api_tokens": ("gauge", "常驻调度：API 预算令牌桶余量"),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, LabelKey], float] = {}
+_gauges: Dict[Tuple[str, LabelKey], float] = {}
+_histograms: Dict[Tuple[str, LabelKey], List] = {}   # [bucket 计数..., sum, count]
+_stage_path: ContextVar[Tuple[str, ...]] = ContextVar("metrics_stage_path", default=())
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, "" if v is None else str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if not ENABLED:
+        return
+    k = (name, _key(labels))
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[(name, _key(labels))] = value
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    if not ENABLED:
+        return
+    k = (name, _key(labels))
+    i = bisect_left(DEFAULT_BUCKETS, seconds)
+    with _lock:
+        h = _histograms.get(k)
+        if h is None:
+            h = _histograms[k] = [0] * (len(DEFAULT_BUCKETS) + 1) + [0.0, 0]
+        h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+
+class _Noop:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+@contextmanager
+def _timed(name: str, labels: Dict[str, object]):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+
+def timer(name: str, **labels):
+    """通用耗时上下文；关闭时返回共享的空上下文"""
+    return _timed(name, labels) if ENABLED else _NOOP
+
+
+_api_hook = None     # core.run_ledger 注册：hook(page: bool, error: Optional[BaseException])
+
+
+def set_api_hook(hook) -> None:
+    global _api_hook
+    _api_hook = hook
+
+
+@contextmanager
+def _api(labels: Dict[str, object], page: bool):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        inc("cloud_api_errors_total", **labels)
+        if _api_hook:
+            _api_hook(page, e)
+        raise
+    else:
+        if _api_hook:
+            _api_hook(page, None)
+    finally:
+        observe("cloud_api_latency_seconds", time.perf_counter() - t0, **labels)
+        inc("cloud_api_calls_total", **labels)
+
+
+def api_call(provider: str, endpoint: str, account: Optional[str] = None, page: bool = False):
+    """一次云 API 调用；page=True 表示分页列举中的一页"""
+    if not ENABLED and _api_hook is None:
+        return _NOOP
+    return _api({"provider": provider, "endpoint": endpoint, "account": account}, page)
+
+
+def timed_iter(it: Iterable, provider: str, endpoint: str, account: Optional[str] = None) -> Iterator:
+    """分页器等惰性迭代：每取一页记一次 API 调用（迭代结束那次 next 不计）"""
+    if not ENABLED and _api_hook is None:
+        yield from it
+        return
+    labels = {"provider": provider, "endpoint": endpoint, "account": account}
+    it = iter(it)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            page = next(it)
+        except StopIteration:
+            return
+        except BaseException as e:
+            inc("cloud_api_errors_total", **labels)
+            if _api_hook:
+                _api_hook(True, e)
+            raise
+        observe("cloud_api_latency_seconds", time.perf_counter() - t0, **labels)
+        inc("cloud_api_calls_total", **labels)
+        if _api_hook:
+            _api_hook(True, None)
+        yield page
+
+
+_stage_hook = None   # utils.profiling 注册：hook(stage_path) -> 上下文管理器
+
+
+def set_stage_hook(hook) -> None:
+    global _stage_hook
+    _stage_hook = hook
+
+
+@contextmanager
+def _stage(name: str):
+    path = _stage_path.get() + (name,)
+    token = _stage_path.set(path)
+    label = "/".join(path)
+    try:
+        with (_stage_hook(label) if _stage_hook else _NOOP):
+            with (_timed("pipeline_stage_seconds", {"stage": label}) if ENABLED else _NOOP):
+                yield
+    finally:
+        _stage_path.reset(token)
+
+
+def stage(name: str):
+    """层级阶段计时：嵌套调用时 stage 标签为父阶段路径 + 本阶段名；profiling 时同时作为切分点"""
+    return _stage(name) if (ENABLED or _stage_hook) else _NOOP
+
+
+# ----------------------------
+# 导出
+# ----------------------------
+def _fmt_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render() -> str:
+    """Prometheus text exposition format 0.0.4"""
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    by_name: Dict[str, List[str]] = {}
+    kinds: Dict[str, str] = {}
+    for (name, labels), v in sorted(counters.items()):
+        kinds[name] = "counter"
+        by_name.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {_fmt_num(v)}")
+    for (name, labels), v in sorted(gauges.items()):
+        kinds[name] = "gauge"
+        by_name.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {_fmt_num(v)}")
+    for (name, labels), h in sorted(histograms.items()):
+        kinds[name] = "histogram"
+        lines = by_name.setdefault(name, [])
+        cum = 0
+        for le, n in zip(DEFAULT_BUCKETS + ("+Inf",), h[:-2]):
+            cum += n
+            lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', str(le)))} {cum}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_num(h[-2])}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {h[-1]}")
+
+    out: List[str] = []
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, (kinds[name], None))
+        if text:
+            out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kinds[name]}")
+        out.extend(by_name[name])
+    return "\n".join(out) + "\n" if out else ""
+
+
+def write_textfile(path: Optional[str] = None) -> Optional[str]:
+    """原子写入（先写临时文件再 rename），避免采集端读到半个文件"""
+    path = path or METRICS_TEXTFILE
+    if not (ENABLED and path):
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write(render())
+    os.replace(tmp, path)
+    return path
+
+
+_server = None
+
+
+def serve(port: Optional[int] = None, addr: str = "127.0.0.1"):
+    """后台线程提供 GET /metrics"""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    if _server is None:
+        _server = ThreadingHTTPServer((addr, port or METRICS_PORT), _Handler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+def start() -> None:
+    """按环境变量启动导出：有端口则起 /metrics，有 textfile 则进程退出时兜底写一次"""
+    if not ENABLED:
+        return
+    if METRICS_PORT:
+        try:
+            serve()
+        except OSError as e:
+            print(f"[!] /metrics 端口 {METRICS_PORT} 启动失败: {e}", file=sys.stderr)
+    if METRICS_TEXTFILE:
+        atexit.register(write_textfile)
+
+
+def flush() -> None:
+    """运行结束时调用：写 textfile（若配置）"""
+    if ENABLED and METRICS_TEXTFILE:
+        try:
+            write_textfile()
+        except OSError as e:
+            print(f"[!] 指标 textfile 写入失败: {e}", file=sys.stderr)
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
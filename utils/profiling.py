@@ -0,0 +1,305 @@
+# utils/profiling.py
+# -*- coding: utf-8 -*-
+"""
+运行级 profiling：按阶段（与 utils.metrics.stage 同一套埋点）统计 CPU 与内存热点。
+
+- CPU：cprofile（确定性，开销较大）或 sample（后台线程按间隔采样主线程调用栈，开销小，适合生产）
+- 内存：tracemalloc，每个阶段进入 / 退出各取一次快照，按分配行汇总增量，并记录阶段内峰值
+- 阶段嵌套时互不重复计入：进入子阶段会暂停父阶段的 cProfile；采样按当前最内层阶段归属
+- 报告写到 PROFILE_DIR（默认 .cache/profile）/<时间戳>/：
+    report.txt   每阶段 top 函数（累计 / 自身时间）与最大分配点
+    report.json  同上，结构化
+    <stage>.prof cprofile 模式下各阶段的 pstats 文件（可用 snakeviz / pstats 打开）
+
+用法（main.py / resolve_all_domains.py 的 --profile 即如此）：
+    with profiling.session("cprofile") as prof:
+        ...
+"""
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils import metrics
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(".cache", "profile"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))   # 秒
+TOP_N = int(os.getenv("PROFILE_TOP", "25"))
+MEM_SNAPSHOTS = int(os.getenv("PROFILE_MEM_SNAPSHOTS", "3"))   # 每个阶段只对前 N 次进入做快照对比（快照较贵）
+TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))   # 只按分配行汇总，1 帧开销最小
+
+MODES = ("cprofile", "sample")
+_SELF_FILES = (tracemalloc.__file__, __file__)
+ROOT = "(root)"
+
+
+class _Sampler(threading.Thread):
+    """对目标线程周期性取栈：叶子帧计 self，栈上每个不同函数计 cumulative"""
+
+    def __init__(self, profiler: "Profiler", thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.profiler = profiler
+        self.thread_id = thread_id
+        self.interval = interval
+        self._halt = threading.Event()
+        self.self_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.cum_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.samples: Counter = Counter()
+
+    def run(self) -> None:
+        while not self._halt.wait(self.interval):
+            if self.profiler.paused:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stage = self.profiler.current_stage
+            self.samples[stage] += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+                if leaf:
+                    self.self_counts[stage][key] += 1
+                    leaf = False
+                if key not in seen:
+                    seen.add(key)
+                    self.cum_counts[stage][key] += 1
+                frame = frame.f_back
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join(timeout=2)
+
+
+class Profiler:
+    def __init__(self, mode: str = "cprofile", out_dir: Optional[str] = None, memory: bool = True,
+                 interval: float = SAMPLE_INTERVAL, top: int = TOP_N):
+        if mode not in MODES:
+            raise ValueError(f"未知 profile 模式：{mode}（可选 {', '.join(MODES)}）")
+        self.mode = mode
+        self.memory = memory
+        self.interval = interval
+        self.top = top
+        self.out_dir = os.path.join(out_dir or PROFILE_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.started_at = time.perf_counter()
+        self._stack: List[str] = [ROOT]
+        self._thread_id = threading.get_ident()
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._wall: Counter = Counter()
+        self._entered: Counter = Counter()
+        self._alloc: Dict[str, Counter] = defaultdict(Counter)
+        self._alloc_count: Dict[str, Counter] = defaultdict(Counter)
+        self._peak: Dict[str, int] = {}
+        self._peak_stack: List[int] = [0]
+        self._overhead = 0.0        # 快照等自身开销，从各阶段 wall 中扣除
+        self.paused = False         # 自身记账期间采样线程跳过
+        self._sampler: Optional[_Sampler] = None
+        self._own_tracemalloc = False
+
+    @property
+    def current_stage(self) -> str:
+        return self._stack[-1]
+
+    # ---------- 生命周期 ----------
+    def start(self) -> "Profiler":
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._own_tracemalloc = True
+        if self.mode == "cprofile":
+            self._profile(ROOT).enable()
+        else:
+            self._sampler = _Sampler(self, self._thread_id, self.interval)
+            self._sampler.start()
+        metrics.set_stage_hook(self.stage)
+        return self
+
+    def stop(self) -> None:
+        metrics.set_stage_hook(None)
+        if self.mode == "cprofile":
+            self._profile(ROOT).disable()
+        elif self._sampler:
+            self._sampler.stop()
+        self._wall[ROOT] = time.perf_counter() - self.started_at - self._overhead
+        if self.memory and tracemalloc.is_tracing():
+            self._peak[ROOT] = max(self._peak_stack[0], tracemalloc.get_traced_memory()[1])
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+
+    def _profile(self, stage: str) -> cProfile.Profile:
+        p = self._profiles.get(stage)
+        if p is None:
+            p = self._profiles[stage] = cProfile.Profile()
+        return p
+
+    # ---------- 阶段 ----------
+    @contextmanager
+    def stage(self, path: str):
+        """path 为 metrics 传入的层级路径；非主线程的阶段不做切换"""
+        if threading.get_ident() != self._thread_id:
+            yield
+            return
+        parent = self._stack[-1]
+        t_pause = time.perf_counter()
+        self.paused = True
+        if self.mode == "cprofile":
+            self._profile(parent).disable()
+        tracing = self.memory and tracemalloc.is_tracing()
+        before = None
+        if tracing:
+            if self._entered[path] < MEM_SNAPSHOTS:
+                before = tracemalloc.take_snapshot()
+            self._peak_stack[-1] = max(self._peak_stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(path)
+        self._peak_stack.append(0)
+        if self.mode == "cprofile":
+            self._profile(path).enable()
+        t0 = time.perf_counter()
+        self._overhead += t0 - t_pause
+        overhead0 = self._overhead
+        self.paused = False
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter()
+            self.paused = True
+            if self.mode == "cprofile":
+                self._profile(path).disable()
+            self._wall[path] += (t1 - t0) - (self._overhead - overhead0)
+            self._entered[path] += 1
+            peak = self._peak_stack.pop()
+            self._stack.pop()
+            if tracing:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                self._peak[path] = max(self._peak.get(path, 0), peak)
+                self._peak_stack[-1] = max(self._peak_stack[-1], peak)
+                if before is not None:
+                    self._record_alloc(path, before, tracemalloc.take_snapshot())
+            if self.mode == "cprofile":
+                self._profile(parent).enable()
+            self._overhead += time.perf_counter() - t1
+            self.paused = False
+
+    def _record_alloc(self, path: str, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> None:
+        for stat in after.compare_to(before, "lineno")[: self.top * 4]:
+            frame = stat.traceback[0]
+            if stat.size_diff > 0 and frame.filename not in _SELF_FILES:
+                site = f"{frame.filename}:{frame.lineno}"
+                self._alloc[path][site] += stat.size_diff
+                self._alloc_count[path][site] += max(stat.count_diff, 0)
+
+    # ---------- 报告 ----------
+    def _cpu_cprofile(self, stage: str) -> Dict[str, List[Dict[str, Any]]]:
+        p = self._profiles.get(stage)
+        if p is None:
+            return {"cumulative": [], "self": []}
+        st = pstats.Stats(p)
+        if not getattr(st, "stats", None):
+            return {"cumulative": [], "self": []}
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _callers) in st.stats.items():
+            rows.append({"function": f"{filename}:{line}({func})", "calls": nc, "self_s": round(tt, 4), "cum_s": round(ct, 4)})
+        return {
+            "cumulative": sorted(rows, key=lambda r: r["cum_s"], reverse=True)[: self.top],
+            "self": sorted(rows, key=lambda r: r["self_s"], reverse=True)[: self.top],
+        }
+
+    def _cpu_sample(self, stage: str) -> Dict[str, List[Dict[str, Any]]]:
+        s = self._sampler
+        total = s.samples.get(stage, 0) if s else 0
+        if not total:
+            return {"cumulative": [], "self": []}
+
+        def rows(counter: Counter) -> List[Dict[str, Any]]:
+            return [{"function": k, "samples": n, "pct": round(100.0 * n / total, 1),
+                     "approx_s": round(n * self.interval, 3)} for k, n in counter.most_common(self.top)]
+        return {"cumulative": rows(s.cum_counts[stage]), "self": rows(s.self_counts[stage]), "samples": total}
+
+    def stages(self) -> List[str]:
+        seen = set(self._wall) | set(self._profiles) | (set(self._sampler.samples) if self._sampler else set())
+        return [ROOT] + sorted(seen - {ROOT})
+
+    def report(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"mode": self.mode, "interval_s": self.interval if self.mode == "sample" else None,
+                               "memory": self.memory, "overhead_s": round(self._overhead, 4), "stages": {}}
+        for stage in self.stages():
+            cpu = self._cpu_cprofile(stage) if self.mode == "cprofile" else self._cpu_sample(stage)
+            out["stages"][stage] = {
+                "wall_s": round(self._wall.get(stage, 0.0), 4),
+                "entered": self._entered.get(stage, 1 if stage == ROOT else 0),
+                "cpu": cpu,
+                "peak_traced_bytes": self._peak.get(stage),
+                "alloc_snapshots": min(self._entered.get(stage, 0), MEM_SNAPSHOTS) if self.memory else 0,
+                "alloc_sites": [{"site": site, "bytes": n, "blocks": self._alloc_count[stage][site]}
+                                for site, n in self._alloc[stage].most_common(self.top)],
+            }
+        return out
+
+    def _text(self, rep: Dict[str, Any]) -> str:
+        lines = [f"profile mode={rep['mode']} memory={rep['memory']} overhead={rep['overhead_s']}s（已从各阶段 wall 扣除）", ""]
+        for stage, s in rep["stages"].items():
+            lines.append(f"=== {stage}  wall={s['wall_s']}s  entered={s['entered']}  peak={s['peak_traced_bytes']}")
+            for kind in ("cumulative", "self"):
+                lines.append(f"  -- top by {kind}")
+                for r in s["cpu"].get(kind, [])[:15]:
+                    metric = (f"cum={r['cum_s']}s self={r['self_s']}s calls={r['calls']}" if "cum_s" in r
+                              else f"{r['pct']}% ({r['samples']} samples)")
+                    lines.append(f"     {metric:<42} {r['function']}")
+            if s["alloc_sites"]:
+                lines.append("  -- largest allocation sites (net bytes)")
+                for r in s["alloc_sites"][:15]:
+                    lines.append(f"     {r['bytes']:>12} B {r['blocks']:>8} blk  {r['site']}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def write(self) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        rep = self.report()
+        with open(os.path.join(self.out_dir, "report.json"), "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(self.out_dir, "report.txt"), "w", encoding="utf-8") as f:
+            f.write(self._text(rep))
+        if self.mode == "cprofile":
+            for stage, p in self._profiles.items():
+                name = re.sub(r"[^A-Za-z0-9_.-]+", "_", stage.strip("()")) or "root"
+                try:
+                    p.dump_stats(os.path.join(self.out_dir, f"{name}.prof"))
+                except (TypeError, ValueError):
+                    pass  # 从未启用过的阶段没有数据
+        return self.out_dir
+
+
+@contextmanager
+def session(mode: Optional[str], out_dir: Optional[str] = None, memory: bool = True):
+    """mode 为空时不做任何事；否则运行结束写报告并打印路径"""
+    if not mode:
+        yield None
+        return
+    prof = Profiler(mode, out_dir=out_dir, memory=memory).start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        try:
+            print(f"[i] profile 报告：{prof.write()}")
+        except OSError as e:
+            print(f"[!] profile 报告写入失败: {e}", file=sys.stderr)
+
+
+def add_arguments(parser) -> None:
+    """给入口脚本的 argparse 加上 --profile 相关参数"""
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=MODES,
+                        help="按阶段 profiling：cprofile（默认）或 sample（采样，开销小）")
+    parser.add_argument("--profile-dir", default=None, help=f"报告目录（默认 {PROFILE_DIR}）")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="profiling 时不跟踪内存分配")
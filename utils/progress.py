@@ -1,31 +1,339 @@
 # utils/progress.py
 # -*- coding: utf-8 -*-
+"""
+进度与吞吐汇报：多线程 / 多任务计数，后台线程按固定频率汇总渲染。
+
+- 热路径只做一次属性自增（每个任务的计数只由其所在线程写，不加锁），渲染线程定期求和
+- TTY：原地刷新多行（总计 records/s、ETA + 每个 provider 一行）；非 TTY：每 PROGRESS_LOG_INTERVAL 秒打一行日志
+- TTY 刷新期间接管终端上的 sys.stdout / sys.stderr 与日志 StreamHandler：其他输出先擦掉进度块再写，
+  下次刷新在这些输出下方重画，不会被进度块覆盖
+- ETA：设置了记录总数时按记录算，否则按任务数（剩余任务 × 平均任务耗时）
+- PROGRESS=0 关闭（所有调用为空操作）
+
+    progress.start()
+    progress.add_total("aws", tasks=len(zones))
+    with progress.task("aws", zone_name):
+        ...
+        progress.advance(n)          # 当前线程所在任务 +n
+    progress.stop()
+
+pbar(it, total, desc) 保留原接口：优先 tqdm，否则按时间间隔刷新的简易进度。
+"""
 import os
 import sys
-from typing import Iterable, Iterator, Optional
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
 
 _USE_TQDM = os.getenv("PROGRESS", "1") != "0"  # 设 PROGRESS=0 可关闭进度条
+ENABLED = _USE_TQDM
+REFRESH = float(os.getenv("PROGRESS_REFRESH", "0.5"))            # TTY 刷新间隔（秒）
+LOG_INTERVAL = float(os.getenv("PROGRESS_LOG_INTERVAL", "10"))   # 非 TTY 日志行间隔（秒）
+RATE_WINDOW = 5.0                                                # records/s 的平滑窗口（秒）
 
 
-def _fallback_bar(it: Iterable, total: Optional[int], desc: str) -> Iterator:
-    count = 0
+def _fmt_secs(s: Optional[float]) -> str:
+    if s is None or s != s or s == float("inf"):
+        return "--:--"
+    s = int(s)
+    h, rem = divmod(s, 3600)
+    return f"{h}:{rem // 60:02d}:{rem % 60:02d}" if h else f"{rem // 60:02d}:{rem % 60:02d}"
+
+
+class Task:
+    __slots__ = ("group", "name", "done", "started", "finished")
+
+    def __init__(self, group: str, name: str):
+        self.group = group
+        self.name = name
+        self.done = 0
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    def update(self, n: int = 1) -> None:
+        self.done += n
+
+
+class _NoopTask:
+    __slots__ = ()
+    done = 0
+
+    def update(self, n: int = 1) -> None:
+        pass
+
+
+_NOOP_TASK = _NoopTask()
+
+
+class _Passthrough:
+    """进度块显示期间替代终端输出流：每次写之前先擦掉进度块，其余属性透传给原始流"""
+
+    def __init__(self, progress: "Progress", stream: TextIO):
+        self._progress = progress
+        self._stream = stream
+
+    def write(self, s: str) -> int:
+        with self._progress._io_lock:
+            self._progress._erase()
+            n = self._stream.write(s)
+            self._stream.flush()  # stdout 与进度块（stderr）交替写，必须保持先后顺序
+            if s:
+                self._progress._midline = not s.endswith("\n")
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class Progress:
+    def __init__(self, stream: Optional[TextIO] = None, refresh: float = REFRESH, log_interval: float = LOG_INTERVAL):
+        self.stream = stream or sys.stderr
+        self.tty = bool(getattr(self.stream, "isatty", lambda: False)())
+        self.interval = refresh if self.tty else log_interval
+        self._lock = threading.Lock()          # 只保护任务列表与总量的增删，不在计数热路径上
+        self._tasks: List[Task] = []
+        self._closed_done: Dict[str, int] = {}   # 已结束任务折叠进来，避免列表无限增长
+        self._closed_tasks: Dict[str, int] = {}
+        self._closed_secs: Dict[str, float] = {}
+        self._total_records: Dict[str, int] = {}
+        self._total_tasks: Dict[str, int] = {}
+        self._history: Dict[str, List[tuple]] = {}   # 分组 -> [(时间, 完成数)]，用于窗口速率；"" 为总计
+        self._lines = 0
+        self._io_lock = threading.RLock()       # 进度块与其他终端输出互斥
+        self._midline = False                   # 其他输出停在行中间时不画进度块
+        self._hooked: List[tuple] = []
+        self._halt = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started = time.monotonic()
+
+    # ---------- 计数 ----------
+    def add_total(self, group: str, records: int = 0, tasks: int = 0) -> None:
+        with self._lock:
+            if records:
+                self._total_records[group] = self._total_records.get(group, 0) + records
+            if tasks:
+                self._total_tasks[group] = self._total_tasks.get(group, 0) + tasks
+
+    def open(self, group: str, name: str) -> Task:
+        t = Task(group, name)
+        with self._lock:
+            self._tasks.append(t)
+        return t
+
+    def close(self, t: Task) -> None:
+        t.finished = time.monotonic()
+        with self._lock:
+            self._tasks.remove(t)
+            g = t.group
+            self._closed_done[g] = self._closed_done.get(g, 0) + t.done
+            self._closed_tasks[g] = self._closed_tasks.get(g, 0) + 1
+            self._closed_secs[g] = self._closed_secs.get(g, 0.0) + (t.finished - t.started)
+
+    # ---------- 汇总 ----------
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            tasks = list(self._tasks)
+            groups = set(self._closed_done) | set(self._total_records) | set(self._total_tasks) | {t.group for t in tasks}
+            out = {g: {"done": self._closed_done.get(g, 0), "tasks_done": self._closed_tasks.get(g, 0),
+                       "task_secs": self._closed_secs.get(g, 0.0), "active": 0,
+                       "total": self._total_records.get(g), "total_tasks": self._total_tasks.get(g)} for g in groups}
+        for t in tasks:
+            out[t.group]["done"] += t.done
+            out[t.group]["active"] += 1
+        return out
+
+    def _rate(self, key: str, now: float, done: int) -> float:
+        h = self._history.setdefault(key, [])
+        h.append((now, done))
+        while len(h) > 2 and now - h[0][0] > RATE_WINDOW:
+            h.pop(0)
+        t0, d0 = h[0]
+        return (done - d0) / (now - t0) if now > t0 else 0.0
+
+    @staticmethod
+    def _eta(g: Dict[str, float], rate: float) -> Optional[float]:
+        if g["total"]:
+            return (g["total"] - g["done"]) / rate if rate > 0 else None
+        if g["total_tasks"] and g["tasks_done"]:
+            remaining = g["total_tasks"] - g["tasks_done"]
+            return max(remaining, 0) * g["task_secs"] / g["tasks_done"]
+        return None
+
+    def lines(self, now: Optional[float] = None) -> List[str]:
+        now = now or time.monotonic()
+        snap = self.snapshot()
+        done = sum(g["done"] for g in snap.values())
+        rate = self._rate("", now, done)
+        elapsed = now - self.started
+        etas = [self._eta(g, self._rate(name, now, g["done"])) for name, g in snap.items()]
+        eta = max((e for e in etas if e is not None), default=None)
+        out = [f"[progress] {done} 条  {rate:.1f}/s  平均 {done / elapsed if elapsed else 0:.1f}/s  "
+               f"已用 {_fmt_secs(elapsed)}  ETA {_fmt_secs(eta)}"]
+        for name in sorted(snap):
+            g = snap[name]
+            tasks = f"{g['tasks_done']}/{g['total_tasks']}" if g["total_tasks"] else f"{g['tasks_done']}"
+            total = f"/{g['total']}" if g["total"] else ""
+            out.append(f"  {name:<12} {g['done']}{total} 条  任务 {tasks}（进行中 {g['active']}）")
+        return out
+
+    # ---------- 渲染 ----------
+    def _erase(self) -> None:
+        """擦掉已画的进度块（调用方持有 _io_lock）"""
+        if self._lines:
+            try:
+                self.stream.write("\x1b[F\x1b[2K" * self._lines)
+            except (OSError, ValueError):
+                pass
+            self._lines = 0
+
+    def render(self, final: bool = False) -> None:
+        lines = self.lines()
+        if not self.tty:
+            buf = lines[0] + "  |  " + "  ".join(l.strip() for l in lines[1:]) + "\n" if len(lines) > 1 else lines[0] + "\n"
+            try:
+                self.stream.write(buf)
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+            return
+        with self._io_lock:
+            if self._midline and not final:
+                return  # 其他输出还没换行，等它写完整行再画
+            self._erase()
+            try:
+                self.stream.write(("\n" if self._midline else "") + "\n".join(lines) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+            self._midline = False
+            self._lines = 0 if final else len(lines)
+
+    def _hook_output(self) -> None:
+        """把终端上的 sys.stdout / sys.stderr 与日志 StreamHandler 换成 _Passthrough"""
+        from utils.logger import console_handlers
+        for name in ("stdout", "stderr"):
+            s = getattr(sys, name)
+            if getattr(s, "isatty", lambda: False)():
+                setattr(sys, name, _Passthrough(self, s))
+                self._hooked.append((sys, name, s))
+        for h in console_handlers():
+            if getattr(h.stream, "isatty", lambda: False)():
+                self._hooked.append((h, None, h.setStream(_Passthrough(self, h.stream))))
+
+    def _unhook_output(self) -> None:
+        for owner, name, stream in reversed(self._hooked):
+            if name is None:
+                owner.setStream(stream)
+            else:
+                setattr(owner, name, stream)
+        self._hooked = []
+
+    def _run(self) -> None:
+        while not self._halt.wait(self.interval):
+            self.render()
+
+    def start(self) -> "Progress":
+        if self._thread is None:
+            if self.tty:
+                self._hook_output()
+            self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._halt.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.render(final=True)
+        self._unhook_output()
+
+
+# ----------------------------
+# 模块级入口
+# ----------------------------
+_progress: Optional[Progress] = None
+_current: ContextVar[Optional[Task]] = ContextVar("progress_task", default=None)
+
+
+def start(stream: Optional[TextIO] = None) -> Optional[Progress]:
+    global _progress
+    if not ENABLED:
+        return None
+    if _progress is None:
+        _progress = Progress(stream).start()
+    return _progress
+
+
+def stop() -> None:
+    global _progress
+    if _progress is not None:
+        _progress.stop()
+        _progress = None
+
+
+def add_total(group: str, records: int = 0, tasks: int = 0) -> None:
+    if _progress is not None:
+        _progress.add_total(group, records, tasks)
+
+
+@contextmanager
+def task(group: str, name: str):
+    """登记一个任务，并设为当前线程 / 上下文的 advance() 目标"""
+    p = _progress
+    if p is None:
+        yield _NOOP_TASK
+        return
+    t = p.open(group, name)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+        p.close(t)
+
+
+def advance(n: int = 1) -> None:
+    t = _current.get()
+    if t is not None:
+        t.done += n
+
+
+# ----------------------------
+# 单个可迭代对象
+# ----------------------------
+def _fallback_bar(it: Iterable, total: Optional[int], desc: str, refresh: float = REFRESH) -> Iterator:
+    """按时间间隔刷新（每 256 条才看一次时钟），不再逐条 write + flush"""
+    stream = sys.stderr
+    tty = stream.isatty()
+    interval = refresh if tty else LOG_INTERVAL
     total = int(total) if (total is not None) else None
     prefix = f"{desc} " if desc else ""
+    t_start = last = time.monotonic()
+    count = 0
+
+    cr = "\r" if tty else ""
+
+    def emit(end: str) -> None:
+        elapsed = time.monotonic() - t_start
+        rate = count / elapsed if elapsed else 0.0
+        pct = f" {int(count * 100 / total)}%" if total else ""
+        eta = f" ETA {_fmt_secs((total - count) / rate)}" if (total and rate) else ""
+        of_total = f"/{total}" if total else ""
+        stream.write(f"{cr}{prefix}{count}{of_total}{pct} {rate:.1f}/s{eta}{end}")
+        stream.flush()
+
     for x in it:
         count += 1
-        if total:
-            pct = int(count * 100 / total) if total else 0
-            sys.stdout.write(f"\r{prefix}{count}/{total} {pct}%")
-        else:
-            if count % 50 == 0:
-                sys.stdout.write(".")
-        sys.stdout.flush()
+        if not (count & 0xFF):
+            now = time.monotonic()
+            if now - last >= interval:
+                last = now
+                emit("" if tty else "\n")
         yield x
-    if total:
-        sys.stdout.write(f"\r{prefix}{count}/{total} 100%\n")
-    else:
-        sys.stdout.write("\n")
-    sys.stdout.flush()
+    emit("\n")
 
 
 def pbar(it: Iterable, total: Optional[int] = None, desc: str = "") -> Iterator:
@@ -37,7 +345,7 @@ def pbar(it: Iterable, total: Optional[int] = None, desc: str = "") -> Iterator:
     if _USE_TQDM:
         try:
             from tqdm import tqdm  # type: ignore
-            return tqdm(it, total=total, desc=desc)
+            return tqdm(it, total=total, desc=desc, mininterval=REFRESH)
         except Exception:
             pass
     return _fallback_bar(it, total, desc)